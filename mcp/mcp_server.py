@@ -1,15 +1,83 @@
 #!/usr/bin/env python3
 import time
 import contextlib
+import functools
 import os
 import re
+import tempfile
+import threading
+import zipfile
 import requests
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from types import MappingProxyType
+from typing import Mapping
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from mcp.server.fastmcp import FastMCP
 from starlette.applications import Starlette
 from starlette.routing import Mount
 
 OLLAMA_HOST = os.environ.get("OLLAMA_HOST", 'localhost:11434')
+# Keep in line with OLLAMA_NUM_PARALLEL of the ollama service
+SUMMARIZE_WORKERS = int(os.environ.get("SUMMARIZE_WORKERS", 4))
 MAX_LOG_FILE_READ_SIZE = 102400
+LOG_HEAD_SIZE = 4096
+MIN_SUMMARIZE_LOG_SIZE = 512
+LOG_DOWNLOAD_WORKERS = 8
+LOG_DOWNLOAD_TIMEOUT = 60
+LOG_DOWNLOAD_CHUNK_SIZE = 256 * 1024
+LOG_CACHE_DIR = os.environ.get("LOG_CACHE_DIR", os.path.join(tempfile.gettempdir(), "patchstorm_log_cache"))
+LOG_CACHE_MAX_AGE = 24 * 60 * 60
+LOG_CACHE_MAX_SIZE = 1024 * 1024 * 1024
+GITHUB_GRAPHQL_URL = "https://api.github.com/graphql"
+ETAG_CACHE_SIZE = 1024
+# Also accepts PR sub-pages such as /files, but not trailing garbage after the PR number
+PR_URL_RE = re.compile(r"https://github\.com/([^/]+)/([^/]+)/pull/(\d+)(?:[/?#].*)?")
+
+# Head commit of a PR together with the GitHub Actions runs of its check suites
+PR_WORKFLOW_RUNS_QUERY = """
+query($owner: String!, $repo: String!, $number: Int!) {
+  repository(owner: $owner, name: $repo) {
+    pullRequest(number: $number) {
+      commits(last: 1) {
+        nodes {
+          commit {
+            checkSuites(first: 50) {
+              nodes {
+                conclusion
+                workflowRun {
+                  databaseId
+                  url
+                  createdAt
+                  updatedAt
+                  workflow {
+                    name
+                  }
+                }
+              }
+            }
+          }
+        }
+      }
+    }
+  }
+}
+"""
+
+# Shared by all GitHub and Ollama requests so connections are kept alive between calls
+_SESSION = requests.Session()
+_ADAPTER = HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=32,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[502, 503, 504]),
+)
+_SESSION.mount("https://", _ADAPTER)
+_SESSION.mount("http://", _ADAPTER)
+
+# url -> (etag, json body) of GitHub API GET responses, least recently stored first
+_etag_cache = OrderedDict()
+_etag_cache_lock = threading.Lock()
 
 github_mcp = FastMCP("patchstorm_mcp")
 
@@ -36,17 +104,7 @@ def get_failing_workflow_logs_from_git_sha(owner: str, repo: str, git_sha: str)
         headers = get_github_auth_headers()
 
         runs = get_workflow_runs_from_sha(owner, repo, git_sha, headers)
-
-        # Filter for failing runs
-        failing_runs = filter_failing_runs(runs)
-        if not failing_runs:
-            return {"message": "No failing workflow runs found for this PR."}
-
-        # Get logs for each failing run
-        result = extract_logs_for_failing_runs(owner, repo, failing_runs, headers)
-
-        result = [summarize(entry) for entry in result]
-        return result
+        return get_failing_logs_from_runs(owner, repo, runs, headers)
     except Exception as e:
         return {"error": str(e)}
 
@@ -69,13 +127,69 @@ def get_failing_workflow_logs_from_pr(pr_url: str) -> dict:
         # Set up GitHub API authentication
         headers = get_github_auth_headers()
 
-        # Get workflow runs for this PR
-        git_sha = get_head_sha_for_pr(owner, repo, pr_number, headers)
-        return get_failing_workflow_logs_from_git_sha(owner, repo, git_sha)
+        # Get workflow runs for this PR's head commit in a single GraphQL round-trip
+        runs = get_workflow_runs_for_pr(owner, repo, pr_number, headers)
+        return get_failing_logs_from_runs(owner, repo, runs, headers)
     except Exception as e:
         return {"error": str(e)}
 
+
+def get_failing_logs_from_runs(owner: str, repo: str, runs: list, headers: dict) -> list | dict:
+    """
+    Extract and summarize the logs of the failing runs among the given workflow runs
+
+    Args:
+        owner: Repository owner
+        repo: Repository name
+        runs: List of workflow runs
+        headers: GitHub API authentication headers
+
+    Returns:
+        list | dict: Failing workflow runs with their summarized logs or a dict with a message key
+    """
+    # Filter for failing runs
+    failing_runs = filter_failing_runs(runs)
+    if not failing_runs:
+        return {"message": "No failing workflow runs found for this PR."}
+
+    # Get and summarize logs for each failing run
+    return extract_and_summarize_logs(owner, repo, failing_runs, headers)
+
+def extract_and_summarize_logs(owner: str, repo: str, failing_runs: list, headers: dict) -> list[dict]:
+    """
+    Extract and summarize the logs of failing workflow runs
+
+    The logs of all runs are downloaded concurrently, or read from the log cache if they
+    were downloaded before. Each run is sent to Ollama as soon as its logs are in, so
+    summarizing overlaps with the remaining downloads. Ollama batches concurrent requests
+    for the same model together, up to its OLLAMA_NUM_PARALLEL setting.
+
+    Args:
+        owner: Repository owner
+        repo: Repository name
+        failing_runs: List of failing workflow runs
+        headers: GitHub API authentication headers
+
+    Returns:
+        list[dict]: Failing runs with their summarized logs, in the order of failing_runs
+    """
+    prune_log_cache()
+    with ThreadPoolExecutor(max_workers=LOG_DOWNLOAD_WORKERS) as download_pool, \
+            ThreadPoolExecutor(max_workers=SUMMARIZE_WORKERS) as summarize_pool:
+        downloads = [download_pool.submit(extract_logs_for_run, owner, repo, run, headers) for run in failing_runs]
+        summaries = {
+            download: summarize_pool.submit(summarize, download.result())
+            for download in as_completed(downloads)
+        }
+        return [summaries[download].result() for download in downloads]
+
 def summarize(entry: dict) -> dict:
+    # Nothing worth an LLM call: no logs, only an error from fetching them, or logs short
+    # enough to be passed on as they are
+    logs = entry['logs']
+    if set(logs) <= {"error"} or sum(len(content) for content in logs.values()) < MIN_SUMMARIZE_LOG_SIZE:
+        return entry
+
     url = f"http://{OLLAMA_HOST}/api/chat"
     payload = {
         "model": "llama3.2",
@@ -86,7 +200,7 @@ def summarize(entry: dict) -> dict:
     }
 
     try:
-        response = requests.post(url, json=payload)
+        response = _SESSION.post(url, json=payload)
         response.raise_for_status()
         entry['logs'] = response.json()["message"]["content"]
     except Exception as e:
@@ -107,8 +221,7 @@ def parse_github_pr_url(pr_url: str) -> tuple:
     Raises:
         ValueError: If the URL is not a valid GitHub PR URL
     """
-    pattern = r"https://github\.com/([^/]+)/([^/]+)/pull/(\d+)"
-    match = re.match(pattern, pr_url)
+    match = PR_URL_RE.fullmatch(pr_url)
     
     if not match:
         raise ValueError("Invalid GitHub PR URL")
@@ -119,12 +232,16 @@ def parse_github_pr_url(pr_url: str) -> tuple:
     
     return owner, repo, pr_number
 
-def get_github_auth_headers() -> dict:
+@functools.lru_cache(maxsize=1)
+def get_github_auth_headers() -> Mapping[str, str]:
     """
     Get GitHub API authentication headers using a personal access token
+
+    The token does not change while the server runs, so the headers are only built once.
+    They are returned read-only since every caller shares them.
     
     Returns:
-        dict: Headers for GitHub API requests
+        Mapping[str, str]: Headers for GitHub API requests
     
     Raises:
         ValueError: If GITHUB_TOKEN environment variable is not set
@@ -138,15 +255,41 @@ def get_github_auth_headers() -> dict:
     if not token:
         raise ValueError("neither GITHUB_TOKEN_FILE nor GITHUB_TOKEN environment variables are set")
         
-    return {
+    return MappingProxyType({
         "Authorization": f"token {token}",
         "Accept": "application/vnd.github.v3+json",
         "User-Agent": "GitHub-Workflow-Log-Extractor"
-    }
+    })
 
-def get_head_sha_for_pr(owner: str, repo: str, pr_number: int, headers: dict) -> str:
+def github_graphql(query: str, variables: dict, headers: dict) -> dict:
     """
-    Get the head SHA for a specific PR
+    Run a query against the GitHub GraphQL API
+
+    Args:
+        query: GraphQL query
+        variables: Variables referenced by the query
+        headers: GitHub API authentication headers
+
+    Returns:
+        dict: The "data" member of the GraphQL response
+
+    Raises:
+        ValueError: If the GraphQL response contains errors
+    """
+    response = _SESSION.post(GITHUB_GRAPHQL_URL, json={"query": query, "variables": variables}, headers=headers)
+    response.raise_for_status()
+    body = response.json()
+    if body.get("errors"):
+        raise ValueError(f"GitHub GraphQL error: {body['errors'][0]['message']}")
+    return body["data"]
+
+
+def get_workflow_runs_for_pr(owner: str, repo: str, pr_number: int, headers: dict) -> list:
+    """
+    Get the workflow runs for the head commit of a PR
+
+    Resolves the PR head commit and its check suites in one GraphQL query instead of
+    a REST lookup of the PR followed by a REST lookup of the runs for its head SHA.
 
     Args:
         owner: Repository owner
@@ -155,14 +298,71 @@ def get_head_sha_for_pr(owner: str, repo: str, pr_number: int, headers: dict) ->
         headers: GitHub API authentication headers
 
     Returns:
-        str: Head SHA of the PR
+        list: Workflow runs shaped like the REST API's workflow_runs entries
+            (id, name, created_at, updated_at, html_url, conclusion)
+
+    Raises:
+        ValueError: If the PR does not exist
+    """
+    data = github_graphql(PR_WORKFLOW_RUNS_QUERY, {"owner": owner, "repo": repo, "number": pr_number}, headers)
+    pull_request = data["repository"]["pullRequest"]
+    if pull_request is None:
+        raise ValueError(f"Pull request {owner}/{repo}#{pr_number} not found")
+
+    runs = []
+    for commit_node in pull_request["commits"]["nodes"]:
+        for check_suite in commit_node["commit"]["checkSuites"]["nodes"]:
+            workflow_run = check_suite["workflowRun"]
+            # Check suites created by other apps than GitHub Actions have no workflow run
+            if workflow_run is None:
+                continue
+            runs.append({
+                "id": workflow_run["databaseId"],
+                "name": workflow_run["workflow"]["name"],
+                "created_at": workflow_run["createdAt"],
+                "updated_at": workflow_run["updatedAt"],
+                "html_url": workflow_run["url"],
+                "conclusion": (check_suite["conclusion"] or "").lower(),
+            })
+    return runs
+
+
+def cached_get(url: str, headers: dict) -> dict:
+    """
+    GET a GitHub API URL and return its JSON body, revalidating previous responses by ETag
+
+    Responses are kept in an LRU cache keyed by URL. When a URL is requested again its
+    ETag is sent as If-None-Match, and a 304 Not Modified answer (which does not count
+    against the GitHub rate limit) is served from the cache.
+
+    Args:
+        url: GitHub API URL
+        headers: GitHub API authentication headers
+
+    Returns:
+        dict: The JSON body of the response
     """
-    pr_url = f"https://api.github.com/repos/{owner}/{repo}/pulls/{pr_number}"
-    response = requests.get(pr_url, headers=headers)
+    with _etag_cache_lock:
+        cached = _etag_cache.get(url)
+
+    request_headers = dict(headers)
+    if cached:
+        request_headers["If-None-Match"] = cached[0]
+    response = _SESSION.get(url, headers=request_headers)
+
+    if cached and response.status_code == 304:
+        return cached[1]
     response.raise_for_status()
-    pr_data = response.json()
-    return pr_data["head"]["sha"]
+    body = response.json()
 
+    etag = response.headers.get("ETag")
+    if etag:
+        with _etag_cache_lock:
+            _etag_cache[url] = (etag, body)
+            _etag_cache.move_to_end(url)
+            while len(_etag_cache) > ETAG_CACHE_SIZE:
+                _etag_cache.popitem(last=False)
+    return body
 
 def get_workflow_runs_from_sha(owner: str, repo: str, git_sha: str, headers: str) -> list:
     """
@@ -179,10 +379,7 @@ def get_workflow_runs_from_sha(owner: str, repo: str, git_sha: str, headers: str
     """
     # Now get workflow runs for this SHA
     runs_url = f"https://api.github.com/repos/{owner}/{repo}/actions/runs?head_sha={git_sha}"
-    response = requests.get(runs_url, headers=headers)
-    response.raise_for_status()
-    
-    return response.json().get("workflow_runs", [])
+    return cached_get(runs_url, headers).get("workflow_runs", [])
 
 def filter_failing_runs(runs: list) -> list:
     """
@@ -196,62 +393,136 @@ def filter_failing_runs(runs: list) -> list:
     """
     return [run for run in runs if run.get("conclusion") == "failure"]
 
-def extract_logs_for_failing_runs(owner: str, repo: str, failing_runs: list, headers: dict) -> list[dict]:
+def extract_logs_for_run(owner: str, repo: str, run: dict, headers: dict) -> dict:
     """
-    Extract logs for failing workflow runs
-    
+    Extract logs for a single workflow run
+
     Args:
         owner: Repository owner
         repo: Repository name
-        failing_runs: List of failing workflow runs
+        run: Workflow run
         headers: GitHub API authentication headers
-        
+
     Returns:
-        dict: Structured results with failing runs and their logs
+        dict: The run with its logs keyed by log file name
     """
-    import io
-    import zipfile
-    
-    result = []
-    
-    for run in failing_runs:
-        run_id = run["id"]
-        
-        # Get log download URL
-        logs_url = f"https://api.github.com/repos/{owner}/{repo}/actions/runs/{run_id}/logs"
-        response = requests.get(logs_url, headers=headers, allow_redirects=False)
-        
-        logs_content = {}
-        if response.status_code == 302:
-            # GitHub returns a redirect to the actual logs
-            download_url = response.headers.get("Location")
-            log_response = requests.get(download_url)
-            
-            if log_response.status_code == 200:
-                # Logs are returned as a ZIP file
-                try:
-                    # Process the ZIP file
-                    zip_data = io.BytesIO(log_response.content)
-                    with zipfile.ZipFile(zip_data) as zip_file:
-                        # Extract each file in the ZIP
-                        for file_name in zip_file.namelist():
-                            with zip_file.open(file_name) as log_file:
-                                # Skip very large log files to prevent memory issues
-                                # Read up to 100KB per log file
-                                log_content = log_file.read(102400).decode('utf-8', errors='replace')
-                                logs_content[file_name] = log_content
-                except Exception as e:
-                    logs_content["error"] = f"Failed to process logs: {str(e)}"
-        
-        result.append({
-            "run_id": run_id,
-            "workflow_name": run.get("name", "Unknown"),
-            "created_at": run.get("created_at"),
-            "html_url": run.get("html_url"),
-            "logs": logs_content
-        })
-        
-    return result
+    run_id = run["id"]
+
+    logs_content = {}
+    try:
+        archive_path = get_run_logs_archive(owner, repo, run, headers)
+        if archive_path:
+            with zipfile.ZipFile(archive_path) as zip_file:
+                # Extract each file in the ZIP
+                for file_info in zip_file.infolist():
+                    logs_content[file_info.filename] = read_log_excerpt(zip_file, file_info)
+    except Exception as e:
+        logs_content["error"] = f"Failed to process logs: {str(e)}"
+
+    return {
+        "run_id": run_id,
+        "workflow_name": run.get("name", "Unknown"),
+        "created_at": run.get("created_at"),
+        "html_url": run.get("html_url"),
+        "logs": logs_content
+    }
+
+def get_run_logs_archive(owner: str, repo: str, run: dict, headers: dict) -> str | None:
+    """
+    Get the path of the log archive of a workflow run, downloading it unless it is cached
+
+    The logs of a run only change when the run is re-run, which also changes its
+    updated_at, so archives are cached on disk under the run ID and that timestamp.
+
+    Args:
+        owner: Repository owner
+        repo: Repository name
+        run: Workflow run
+        headers: GitHub API authentication headers
+
+    Returns:
+        str | None: Path of the ZIP archive, or None if the logs are not available
+    """
+    run_id = run["id"]
+    run_version = re.sub(r"\W", "", run.get("updated_at") or "")
+    cache_path = os.path.join(LOG_CACHE_DIR, f"{run_id}_{run_version}.zip")
+    if os.path.exists(cache_path):
+        # Mark the archive as recently used for prune_log_cache
+        os.utime(cache_path)
+        return cache_path
+
+    # Get log download URL
+    logs_url = f"https://api.github.com/repos/{owner}/{repo}/actions/runs/{run_id}/logs"
+    response = _SESSION.get(logs_url, headers=headers, allow_redirects=False, timeout=LOG_DOWNLOAD_TIMEOUT)
+    if response.status_code != 302:
+        return None
+
+    # GitHub returns a redirect to the actual logs, which are a ZIP file
+    download_url = response.headers.get("Location")
+    with _SESSION.get(download_url, stream=True, timeout=LOG_DOWNLOAD_TIMEOUT) as log_response:
+        if log_response.status_code != 200:
+            return None
+        # Stream to a temporary file that is renamed once complete, so a partial download is never cached
+        os.makedirs(LOG_CACHE_DIR, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=LOG_CACHE_DIR, suffix=".tmp", delete=False) as download_file:
+            try:
+                for chunk in log_response.iter_content(chunk_size=LOG_DOWNLOAD_CHUNK_SIZE):
+                    download_file.write(chunk)
+            except BaseException:
+                os.unlink(download_file.name)
+                raise
+    os.replace(download_file.name, cache_path)
+    return cache_path
+
+def prune_log_cache():
+    """
+    Remove log archives unused for LOG_CACHE_MAX_AGE, then the least recently used ones
+    until the cache fits in LOG_CACHE_MAX_SIZE
+    """
+    try:
+        entries = [entry for entry in os.scandir(LOG_CACHE_DIR) if entry.is_file()]
+    except FileNotFoundError:
+        return
+
+    now = time.time()
+    kept = []
+    for entry in entries:
+        stat = entry.stat()
+        if now - stat.st_mtime > LOG_CACHE_MAX_AGE:
+            os.unlink(entry.path)
+        elif entry.name.endswith(".zip"):
+            kept.append((stat.st_mtime, stat.st_size, entry.path))
+
+    cache_size = sum(size for _, size, _ in kept)
+    for _, size, path in sorted(kept):
+        if cache_size <= LOG_CACHE_MAX_SIZE:
+            break
+        os.unlink(path)
+        cache_size -= size
+
+def read_log_excerpt(zip_file: zipfile.ZipFile, file_info: zipfile.ZipInfo) -> str:
+    """
+    Read a log file from a run's log archive, truncating very large log files
+
+    Failures are almost always reported at the end of a log, so a truncated log keeps its
+    first LOG_HEAD_SIZE bytes, which identify the job, and its end, up to
+    MAX_LOG_FILE_READ_SIZE bytes in total.
+
+    Args:
+        zip_file: Log archive of a workflow run
+        file_info: Log file in the archive
+
+    Returns:
+        str: The log file content
+    """
+    with zip_file.open(file_info) as log_file:
+        if file_info.file_size <= MAX_LOG_FILE_READ_SIZE:
+            return log_file.read().decode('utf-8', errors='replace')
+        head = log_file.read(LOG_HEAD_SIZE)
+        # Decompresses up to the tail without keeping the skipped part in memory
+        log_file.seek(file_info.file_size - (MAX_LOG_FILE_READ_SIZE - LOG_HEAD_SIZE))
+        tail = log_file.read()
+    return f"{head.decode('utf-8', errors='replace')}\n[...]\n{tail.decode('utf-8', errors='replace')}"
 
 app = github_mcp.streamable_http_app()   # this serves the MCP endpoint
 
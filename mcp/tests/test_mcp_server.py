@@ -0,0 +1,171 @@
+import os
+import time
+import unittest.mock as mock
+import zipfile
+from collections import OrderedDict
+
+import pytest
+
+# The mcp directory of this repo has no __init__.py, so only a submodule shows whether the SDK is installed
+pytest.importorskip("mcp.server.fastmcp")
+
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import mcp_server
+
+
+@pytest.fixture(autouse=True)
+def log_cache(tmp_path, monkeypatch):
+    """Give every test an empty log cache directory and ETag cache."""
+    monkeypatch.setattr(mcp_server, 'LOG_CACHE_DIR', str(tmp_path))
+    monkeypatch.setattr(mcp_server, '_etag_cache', OrderedDict())
+    return tmp_path
+
+
+@pytest.fixture
+def mock_session():
+    with mock.patch.object(mcp_server, '_SESSION') as session:
+        yield session
+
+
+def _response(status_code, json_body=None, headers=None):
+    response = mock.MagicMock(status_code=status_code, headers=headers or {})
+    response.json.return_value = json_body
+    # Streamed downloads are used as context managers
+    response.__enter__.return_value = response
+    return response
+
+
+def _log_download(chunks):
+    """Responses for the log URL redirect and the streamed archive download."""
+    download = _response(200)
+    download.iter_content.side_effect = lambda chunk_size: chunks()
+    return [_response(302, headers={"Location": "https://download/logs.zip"}), download]
+
+
+def _write_file(path, size, mtime):
+    with open(path, 'wb') as f:
+        f.write(b"x" * size)
+    os.utime(path, (mtime, mtime))
+
+
+def test_get_workflow_runs_for_pr_reshapes_check_suites(mock_session):
+    """Test that GraphQL check suites are returned like REST workflow runs, skipping non-Actions suites."""
+    mock_session.post.return_value = _response(200, {"data": {"repository": {"pullRequest": {"commits": {"nodes": [
+        {"commit": {"checkSuites": {"nodes": [
+            {"conclusion": "FAILURE", "workflowRun": {
+                "databaseId": 1, "url": "https://github.com/org/repo/actions/runs/1",
+                "createdAt": "2024-01-01T00:00:00Z", "updatedAt": "2024-01-01T00:05:00Z",
+                "workflow": {"name": "CI"}}},
+            {"conclusion": "SUCCESS", "workflowRun": None},
+            {"conclusion": None, "workflowRun": {
+                "databaseId": 2, "url": "https://github.com/org/repo/actions/runs/2",
+                "createdAt": "2024-01-01T00:00:00Z", "updatedAt": "2024-01-01T00:01:00Z",
+                "workflow": {"name": "Lint"}}},
+        ]}}},
+    ]}}}}})
+
+    runs = mcp_server.get_workflow_runs_for_pr("org", "repo", 7, {})
+
+    assert runs == [
+        {"id": 1, "name": "CI", "created_at": "2024-01-01T00:00:00Z", "updated_at": "2024-01-01T00:05:00Z",
+         "html_url": "https://github.com/org/repo/actions/runs/1", "conclusion": "failure"},
+        {"id": 2, "name": "Lint", "created_at": "2024-01-01T00:00:00Z", "updated_at": "2024-01-01T00:01:00Z",
+         "html_url": "https://github.com/org/repo/actions/runs/2", "conclusion": ""},
+    ]
+    assert mock_session.post.call_args[1]["json"]["variables"] == {"owner": "org", "repo": "repo", "number": 7}
+
+
+def test_cached_get_not_modified(mock_session):
+    """Test that a 304 answer to a revalidated request returns the cached body."""
+    mock_session.get.side_effect = [
+        _response(200, {"workflow_runs": [{"id": 1}]}, headers={"ETag": '"abc"'}),
+        _response(304),
+    ]
+
+    assert mcp_server.cached_get("https://api/runs", {"Authorization": "token t"}) == {"workflow_runs": [{"id": 1}]}
+    assert mcp_server.cached_get("https://api/runs", {"Authorization": "token t"}) == {"workflow_runs": [{"id": 1}]}
+    assert mock_session.get.call_args_list[1][1]["headers"] == {"Authorization": "token t", "If-None-Match": '"abc"'}
+
+
+def test_get_run_logs_archive_cached_per_run_version(mock_session, log_cache):
+    """Test that an archive is downloaded once per run ID and updated_at, then served from disk."""
+    mock_session.get.side_effect = _log_download(lambda: iter([b"PK", b"data"]))
+    run = {"id": 42, "updated_at": "2024-01-01T00:05:00Z"}
+
+    path = mcp_server.get_run_logs_archive("org", "repo", run, {})
+    assert path == str(log_cache / "42_20240101T000500Z.zip")
+    with open(path, 'rb') as f:
+        assert f.read() == b"PKdata"
+
+    assert mcp_server.get_run_logs_archive("org", "repo", run, {}) == path
+    assert mock_session.get.call_count == 2
+
+    # A re-run changes updated_at, so its logs are downloaded again
+    mock_session.get.side_effect = _log_download(lambda: iter([b"PK"]))
+    rerun = {"id": 42, "updated_at": "2024-01-01T01:00:00Z"}
+    assert mcp_server.get_run_logs_archive("org", "repo", rerun, {}) != path
+    assert mock_session.get.call_count == 4
+
+
+def test_get_run_logs_archive_failed_download_not_cached(mock_session, log_cache):
+    """Test that a download failing mid-stream leaves no file in the cache."""
+    def chunks():
+        yield b"PK"
+        raise ConnectionError("connection reset")
+    mock_session.get.side_effect = _log_download(chunks)
+
+    with pytest.raises(ConnectionError):
+        mcp_server.get_run_logs_archive("org", "repo", {"id": 42, "updated_at": "2024-01-01T00:05:00Z"}, {})
+    assert os.listdir(log_cache) == []
+
+
+def test_get_run_logs_archive_unavailable(mock_session, log_cache):
+    """Test that runs without downloadable logs return None."""
+    mock_session.get.return_value = _response(410)
+
+    assert mcp_server.get_run_logs_archive("org", "repo", {"id": 42}, {}) is None
+    assert os.listdir(log_cache) == []
+
+
+def test_prune_log_cache(log_cache, monkeypatch):
+    """Test that expired files go first, then the least recently used archives until the cache fits."""
+    monkeypatch.setattr(mcp_server, 'LOG_CACHE_MAX_SIZE', 20)
+    now = time.time()
+    expired = now - mcp_server.LOG_CACHE_MAX_AGE - 1
+    _write_file(log_cache / "1_expired.zip", 1, expired)
+    _write_file(log_cache / "abandoned.tmp", 1, expired)
+    _write_file(log_cache / "2_oldest.zip", 10, now - 300)
+    _write_file(log_cache / "3_older.zip", 10, now - 200)
+    _write_file(log_cache / "4_newest.zip", 10, now - 100)
+    # A download in progress is neither removed nor counted against the size limit
+    _write_file(log_cache / "downloading.tmp", 100, now)
+
+    mcp_server.prune_log_cache()
+
+    assert sorted(os.listdir(log_cache)) == ["3_older.zip", "4_newest.zip", "downloading.tmp"]
+
+
+def test_prune_log_cache_missing_dir(monkeypatch, tmp_path):
+    """Test that pruning a cache that was never created does nothing."""
+    monkeypatch.setattr(mcp_server, 'LOG_CACHE_DIR', str(tmp_path / "missing"))
+
+    mcp_server.prune_log_cache()
+
+
+def test_read_log_excerpt(tmp_path):
+    """Test that small logs are read whole, and oversized logs keep their head and last bytes."""
+    small = b"all good\n"
+    large = b"".join(b"line %d\n" % i for i in range(50000))
+    assert len(large) > mcp_server.MAX_LOG_FILE_READ_SIZE
+    with zipfile.ZipFile(tmp_path / "logs.zip", 'w', compression=zipfile.ZIP_DEFLATED) as zip_file:
+        zip_file.writestr("small.txt", small)
+        zip_file.writestr("large.txt", large)
+
+    with zipfile.ZipFile(tmp_path / "logs.zip") as zip_file:
+        assert mcp_server.read_log_excerpt(zip_file, zip_file.getinfo("small.txt")) == "all good\n"
+        excerpt = mcp_server.read_log_excerpt(zip_file, zip_file.getinfo("large.txt"))
+
+    head = large[:mcp_server.LOG_HEAD_SIZE].decode()
+    tail = large[-(mcp_server.MAX_LOG_FILE_READ_SIZE - mcp_server.LOG_HEAD_SIZE):].decode()
+    assert excerpt == f"{head}\n[...]\n{tail}"
@@ -1,10 +1,147 @@
+import functools
+import hashlib
+import json
+import math
 import os
+import tempfile
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from github import Github, UnknownObjectException
 from github import Auth
-from typing import Dict, List
+from dataclasses import dataclass
+from typing import Dict, Iterator
 
-from patchstorm.config import GITHUB_ORGANIZATION, GITHUB_TOKEN
+from patchstorm.config import ARTIFACTS_DIR, GITHUB_ORGANIZATION, GITHUB_TOKEN
+
+PER_PAGE = 100
+SEARCH_MAX_RESULTS = 1000
+SEARCH_WORKERS = 8
+# Start spreading search requests over the rest of the rate limit window below this many requests
+SEARCH_RATE_LIMIT_THRESHOLD = 5
+SEARCH_CACHE_DIR = os.path.join(ARTIFACTS_DIR, '.search_cache')
+# Search results are reused from disk for this many seconds
+SEARCH_CACHE_TTL = 600
+
+# Shared client, so its HTTP connections and rate limit state are reused between calls
+_GH = Github(auth=Auth.Token(GITHUB_TOKEN), per_page=PER_PAGE, pool_size=16)
+# Search requests left in the rate limit window that resets at _search_reset, counted down locally
+# as requests are started, so concurrent workers do not all act on the same stale response headers
+_search_remaining = None
+_search_reset = None
+_search_rate_limit_lock = threading.Lock()
+
+OPEN_PRS_QUERY = """
+query($owner: String!, $name: String!, $cursor: String) {
+  repository(owner: $owner, name: $name) {
+    pullRequests(first: 100, states: OPEN, after: $cursor) {
+      pageInfo {
+        endCursor
+        hasNextPage
+      }
+      nodes {
+        number
+        title
+        url
+        isDraft
+      }
+    }
+  }
+}
+"""
+
+
+@dataclass(frozen=True)
+class PullRequest:
+    """An open pull request."""
+    number: int
+    title: str
+    url: str
+    draft: bool
+
+
+def _wait_for_search_rate_limit():
+    """
+    Reserve one search request, pacing requests according to the rate limit.
+
+    The remaining count comes from the rate limit headers of the last response, lowered by the
+    requests already started in the same window whose responses have not arrived yet.
+    Does not sleep at all until fewer than SEARCH_RATE_LIMIT_THRESHOLD requests are left,
+    then spreads the remaining requests evenly until the rate limit resets.
+    """
+    global _search_remaining, _search_reset
+    with _search_rate_limit_lock:
+        remaining, _ = _GH.rate_limiting
+        reset = _GH.rate_limiting_resettime
+        if reset == _search_reset:
+            remaining = min(remaining, _search_remaining)
+        if remaining < SEARCH_RATE_LIMIT_THRESHOLD:
+            # Sleeping under the lock also holds back the other workers, which is the pacing we want
+            time.sleep(max(0, reset - time.time()) / max(remaining, 1))
+        _search_remaining, _search_reset = remaining - 1, reset
+
+
+def _get_search_page(paginated, page):
+    """Fetch one page of search results, respecting the search rate limit."""
+    _wait_for_search_rate_limit()
+    return paginated.get_page(page)
+
+
+def _search_repos_uncached(query):
+    """Run a code search query and collect the repositories of all hits."""
+    result_repos = set()
+    paginated = _GH.search_code(query)
+    # The first page also tells how many results, and thus pages, there are
+    first_page = _get_search_page(paginated, 0)
+    print(f"Processing {paginated.totalCount} repo results")
+    result_repos.update(hit.repository.full_name for hit in first_page)
+
+    # Code search never returns more than SEARCH_MAX_RESULTS results
+    page_count = min(math.ceil(paginated.totalCount / PER_PAGE), SEARCH_MAX_RESULTS // PER_PAGE)
+    with ThreadPoolExecutor(max_workers=SEARCH_WORKERS) as pool:
+        pages = pool.map(lambda page: _get_search_page(paginated, page), range(1, page_count))
+        for pages_done, hits in enumerate(pages, start=2):
+            result_repos.update(hit.repository.full_name for hit in hits)
+            print(f"{pages_done / page_count:.2%} done")
+    return result_repos
+
+
+@functools.lru_cache(maxsize=128)
+def _search_repos(search_query):
+    """
+    Find the repositories with code matching a code search query.
+
+    Results are cached in memory for the life of the process, and on disk under
+    SEARCH_CACHE_DIR for SEARCH_CACHE_TTL seconds. Failed searches raise and are not cached.
+
+    Returns:
+        frozenset: Repository names.
+    """
+    # Key the disk cache on the query actually sent, so a different organization never reuses results
+    query = f'org:{GITHUB_ORGANIZATION} {search_query} NOT is:archived'
+    cache_file = os.path.join(SEARCH_CACHE_DIR, f"{hashlib.sha256(query.encode()).hexdigest()}.json")
+    try:
+        if time.time() - os.path.getmtime(cache_file) < SEARCH_CACHE_TTL:
+            with open(cache_file) as f:
+                return frozenset(json.load(f))
+    except (OSError, ValueError):
+        pass
+
+    result_repos = frozenset(_search_repos_uncached(query))
+    # Write to a temporary file that is renamed once complete, so a partial write is never read back.
+    # The cache is only an optimization; failing to write it must not fail a search that succeeded.
+    try:
+        os.makedirs(SEARCH_CACHE_DIR, exist_ok=True)
+        with tempfile.NamedTemporaryFile('w', dir=SEARCH_CACHE_DIR, suffix=".tmp", delete=False) as tmp_file:
+            try:
+                json.dump(sorted(result_repos), tmp_file)
+            except BaseException:
+                os.unlink(tmp_file.name)
+                raise
+        os.replace(tmp_file.name, cache_file)
+    except OSError as e:
+        print(f"Failed to write search cache {cache_file}: {e}")
+    return result_repos
 
 
 def get_repos(repos=None, search_query=None):
@@ -30,16 +167,7 @@ def get_repos(repos=None, search_query=None):
     
     # Handle search_query parameter if provided
     if search_query:
-        auth = Auth.Token(GITHUB_TOKEN)
-        g = Github(auth=auth)
-
-        paginated = g.search_code(f'org:{GITHUB_ORGANIZATION} {search_query} NOT is:archived')
-        print(f"Processing {paginated.totalCount} repo results")
-        for i, page in enumerate(paginated):
-            result_repos.add(page.repository.full_name)
-            time.sleep(0.2)
-            if not i % 25:
-                print(f"{i / paginated.totalCount:.2%} done")
+        result_repos.update(_search_repos(search_query))
     
     if not result_repos:
         raise ValueError("No repositories found with the provided repos or search_query parameters.")
@@ -47,15 +175,26 @@ def get_repos(repos=None, search_query=None):
     return result_repos
 
 
-def get_repo_prs(repo_name: str) -> List:
+def get_repo_prs(repo_name: str) -> Iterator[PullRequest]:
     """
     Fetch all open and draft PRs for a given repository.
+
+    Uses GraphQL to fetch 100 PRs per request with only the fields we need, instead of
+    the 30 per request of the REST API. Pages are fetched lazily as the PRs are iterated,
+    so callers that stop early do not request the remaining pages.
     """
-    auth = Auth.Token(GITHUB_TOKEN)
-    g = Github(auth=auth)
-    try:
-        repo = g.get_repo(repo_name)
-    except UnknownObjectException as e:
-        raise RuntimeError(f"Repository {repo_name} not found or inaccessible.") from e
-    # has attributes like number, title, url, draft
-    return repo.get_pulls(state='open')
+    owner, _, name = repo_name.partition('/')
+    if not owner or not name:
+        raise RuntimeError(f"Repository {repo_name} not found or inaccessible.")
+    cursor = None
+    while True:
+        try:
+            _, response = _GH.requester.graphql_query(OPEN_PRS_QUERY, {"owner": owner, "name": name, "cursor": cursor})
+        except UnknownObjectException as e:
+            raise RuntimeError(f"Repository {repo_name} not found or inaccessible.") from e
+        pull_requests = response["data"]["repository"]["pullRequests"]
+        for node in pull_requests["nodes"]:
+            yield PullRequest(number=node["number"], title=node["title"], url=node["url"], draft=node["isDraft"])
+        if not pull_requests["pageInfo"]["hasNextPage"]:
+            return
+        cursor = pull_requests["pageInfo"]["endCursor"]
@@ -1,4 +1,4 @@
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass
 from typing import Set, Dict, Any, List, ClassVar, Type
 import json
 
@@ -16,21 +16,25 @@ class RunAgentConfig:
     draft: bool = False
     
     def to_dict(self) -> Dict[str, Any]:
-        """Convert the config to a dictionary."""
-        config_dict = asdict(self)
-        
-        # Convert sets to lists for JSON serialization
-        config_dict['repos'] = list(config_dict['repos'])
-        
-        # Handle reviewers set if it exists
-        if config_dict['reviewers'] is not None:
-            config_dict['reviewers'] = list(config_dict['reviewers'])
-        
-        return config_dict
+        """Convert the config to a dictionary.
+
+        Built by hand rather than with dataclasses.asdict, which deep-copies every field.
+        """
+        return {
+            'commit_msg': self.commit_msg,
+            'prompts': self.prompts,
+            'agent_provider': self.agent_provider,
+            # Convert sets to lists for JSON serialization
+            'repos': list(self.repos),
+            'skip_pr': self.skip_pr,
+            'dry': self.dry,
+            'reviewers': list(self.reviewers) if self.reviewers is not None else None,
+            'draft': self.draft,
+        }
     
     def to_json(self) -> str:
         """Convert the config to a JSON string."""
-        return json.dumps(self.to_dict())
+        return json.dumps(self.to_dict(), separators=(',', ':'))
         
     def __iter__(self):
         """Make the dataclass iterable for dict() conversion."""
@@ -1,6 +1,19 @@
-from jsonschema import validate, ValidationError
+import copy
+import functools
+import logging
+
+from jsonschema import Draft202012Validator
+from jsonschema.exceptions import best_match
 import yaml
 
+# Use libyaml's C parser when PyYAML was built with it; it is many times faster than the pure Python one
+try:
+    from yaml import CSafeLoader as YAML_LOADER
+except ImportError:
+    from yaml import SafeLoader as YAML_LOADER
+
+logger = logging.getLogger(__name__)
+
 SCHEMA_YAML = """
 type: object
 required: [agent, commit, prompts]
@@ -55,16 +68,42 @@ properties:
     description: Whether to create pull requests as drafts. Defaults to false if not specified.
 """
 
-SCHEMA = yaml.safe_load(SCHEMA_YAML)
+SCHEMA = yaml.load(SCHEMA_YAML, Loader=YAML_LOADER)
+
+# Checked and compiled once, instead of on every jsonschema.validate() call
+Draft202012Validator.check_schema(SCHEMA)
+_VALIDATOR = Draft202012Validator(SCHEMA)
 
 def validate_task_definition_yaml(yml_str):
     """
-    Validate the task definition YAML string against the schema.
+    Parse the task definition YAML string and validate it against the schema.
+
+    Returns:
+        dict: The parsed task definition.
+    """
+    # Copy, so callers cannot change the cached result
+    return copy.deepcopy(_parse_task_definition_yaml(yml_str))
+
+
+@functools.lru_cache(maxsize=256)
+def _parse_task_definition_yaml(yml_str):
+    """
+    Parse and validate a task definition YAML string.
+
+    Results are cached by string, so validating the same YAML again is a dict lookup.
+    Invalid YAML raises on every call.
+    """
+    yaml_obj = yaml.load(yml_str, Loader=YAML_LOADER)
+    logger.debug("task definition: %r", yaml_obj)
+    validate_task_definition(yaml_obj)
+    return yaml_obj
+
+
+def validate_task_definition(task_def):
+    """
+    Validate an already parsed task definition against the schema.
     """
-    try:
-        yaml_obj = yaml.safe_load(yml_str)
-        print(yaml_obj)
-        validate(yaml_obj, SCHEMA)
-        return True
-    except ValidationError as e:
-        raise ValueError(f"YAML validation error: {e.message}")
\ No newline at end of file
+    # Report the same error jsonschema.validate() would pick
+    error = best_match(_VALIDATOR.iter_errors(task_def))
+    if error is not None:
+        raise ValueError(f"YAML validation error: {error.message}")
\ No newline at end of file
@@ -0,0 +1,228 @@
+import threading
+import unittest.mock as mock
+
+import pytest
+from github import UnknownObjectException
+
+from patchstorm import github_utils
+from patchstorm.github_utils import get_repos, get_repo_prs, PullRequest, _wait_for_search_rate_limit
+
+
+@pytest.fixture(autouse=True)
+def search_cache(tmp_path, monkeypatch):
+    """Give every test empty search caches and no search requests counted against the rate limit."""
+    monkeypatch.setattr(github_utils, 'SEARCH_CACHE_DIR', str(tmp_path))
+    monkeypatch.setattr(github_utils, '_search_remaining', None)
+    monkeypatch.setattr(github_utils, '_search_reset', None)
+    github_utils._search_repos.cache_clear()
+    yield tmp_path
+    github_utils._search_repos.cache_clear()
+
+
+def _prs_page(nodes, end_cursor=None, has_next_page=False):
+    return {}, {
+        "data": {
+            "repository": {
+                "pullRequests": {
+                    "pageInfo": {"endCursor": end_cursor, "hasNextPage": has_next_page},
+                    "nodes": nodes,
+                }
+            }
+        }
+    }
+
+
+@mock.patch('patchstorm.github_utils._GH')
+def test_get_repo_prs_follows_cursors(mock_gh):
+    """Test that open PRs from every GraphQL page are returned."""
+    graphql_query = mock_gh.requester.graphql_query
+    graphql_query.side_effect = [
+        _prs_page([{"number": 1, "title": "First", "url": "https://github.com/org/repo/pull/1", "isDraft": False}],
+                  end_cursor="cursor1", has_next_page=True),
+        _prs_page([{"number": 2, "title": "Second", "url": "https://github.com/org/repo/pull/2", "isDraft": True}]),
+    ]
+
+    prs = list(get_repo_prs("org/repo"))
+
+    assert prs == [
+        PullRequest(number=1, title="First", url="https://github.com/org/repo/pull/1", draft=False),
+        PullRequest(number=2, title="Second", url="https://github.com/org/repo/pull/2", draft=True),
+    ]
+    assert graphql_query.call_args_list[0][0][1] == {"owner": "org", "name": "repo", "cursor": None}
+    assert graphql_query.call_args_list[1][0][1] == {"owner": "org", "name": "repo", "cursor": "cursor1"}
+
+
+@mock.patch('patchstorm.github_utils._GH')
+def test_get_repo_prs_stops_fetching_when_iteration_stops(mock_gh):
+    """Test that later pages are not requested once the caller found what it needed."""
+    graphql_query = mock_gh.requester.graphql_query
+    graphql_query.side_effect = [
+        _prs_page([{"number": 1, "title": "First", "url": "https://github.com/org/repo/pull/1", "isDraft": False}],
+                  end_cursor="cursor1", has_next_page=True),
+    ]
+
+    assert any(pr.title == "First" for pr in get_repo_prs("org/repo"))
+    assert graphql_query.call_count == 1
+
+
+@mock.patch('patchstorm.github_utils._GH')
+def test_get_repo_prs_missing_repo(mock_gh):
+    """Test that a repository that cannot be resolved raises a RuntimeError."""
+    mock_gh.requester.graphql_query.side_effect = UnknownObjectException(404, {}, {})
+
+    with pytest.raises(RuntimeError) as excinfo:
+        list(get_repo_prs("org/missing"))
+    assert "org/missing" in str(excinfo.value)
+
+
+@pytest.mark.parametrize("repo_name", ["repo", "org/", "/repo"])
+@mock.patch('patchstorm.github_utils._GH')
+def test_get_repo_prs_malformed_repo_name(mock_gh, repo_name):
+    """Test that a repository name that is not owner/name raises a RuntimeError without a request."""
+    with pytest.raises(RuntimeError) as excinfo:
+        list(get_repo_prs(repo_name))
+    assert repo_name in str(excinfo.value)
+    mock_gh.requester.graphql_query.assert_not_called()
+
+
+@mock.patch('patchstorm.github_utils.time.sleep')
+@mock.patch('patchstorm.github_utils._GH')
+def test_wait_for_search_rate_limit(mock_gh, mock_sleep):
+    """Test that search requests are only paced once the rate limit runs low."""
+    mock_gh.rate_limiting = (20, 30)
+    _wait_for_search_rate_limit()
+    mock_sleep.assert_not_called()
+
+    mock_gh.rate_limiting = (2, 30)
+    with mock.patch('patchstorm.github_utils.time.time', return_value=1000):
+        mock_gh.rate_limiting_resettime = 1030
+        _wait_for_search_rate_limit()
+    mock_sleep.assert_called_once_with(15)
+
+
+@mock.patch('patchstorm.github_utils.time.sleep')
+@mock.patch('patchstorm.github_utils._GH')
+def test_wait_for_search_rate_limit_counts_requests_in_flight(mock_gh, mock_sleep):
+    """Test that requests started since the last response count against the rate limit."""
+    mock_gh.rate_limiting = (5, 30)
+    mock_gh.rate_limiting_resettime = 1030
+    with mock.patch('patchstorm.github_utils.time.time', return_value=1000):
+        _wait_for_search_rate_limit()
+        mock_sleep.assert_not_called()
+        # The headers still say 5 left, but one request went out after them
+        _wait_for_search_rate_limit()
+        mock_sleep.assert_called_once_with(7.5)
+
+        # A new window resets the count
+        mock_sleep.reset_mock()
+        mock_gh.rate_limiting_resettime = 1090
+        _wait_for_search_rate_limit()
+        mock_sleep.assert_not_called()
+
+
+@mock.patch('patchstorm.github_utils._wait_for_search_rate_limit')
+@mock.patch('patchstorm.github_utils._GH')
+def test_get_repos_fetches_every_search_page(mock_gh, mock_wait):
+    """Test that repositories from all pages of code search results are returned."""
+    def get_page(page):
+        return [mock.Mock(**{"repository.full_name": f"org/repo{page}"}),
+                mock.Mock(**{"repository.full_name": "org/common"})]
+
+    paginated = mock_gh.search_code.return_value
+    paginated.totalCount = 250
+    paginated.get_page.side_effect = get_page
+
+    repos = get_repos(None, "path:.github")
+
+    assert repos == {"org/repo0", "org/repo1", "org/repo2", "org/common"}
+    assert sorted(c[0][0] for c in paginated.get_page.call_args_list) == [0, 1, 2]
+
+
+@mock.patch('patchstorm.github_utils._wait_for_search_rate_limit')
+@mock.patch('patchstorm.github_utils._GH')
+def test_get_repos_fetches_pages_concurrently(mock_gh, mock_wait):
+    """Test that search pages after the first are fetched in parallel, and every page is paced."""
+    both_pages_requested = threading.Barrier(2, timeout=5)
+
+    def get_page(page):
+        if page > 0:
+            # Only returns once another page is being fetched at the same time
+            both_pages_requested.wait()
+        return [mock.Mock(**{"repository.full_name": f"org/repo{page}"})]
+
+    paginated = mock_gh.search_code.return_value
+    paginated.totalCount = 300
+    paginated.get_page.side_effect = get_page
+
+    assert get_repos(None, "path:.github") == {"org/repo0", "org/repo1", "org/repo2"}
+    assert mock_wait.call_count == 3
+
+
+@mock.patch('patchstorm.github_utils._GH')
+def test_get_repos_caps_pages_at_search_limit(mock_gh):
+    """Test that pages past the 1000 results code search returns are not requested."""
+    paginated = mock_gh.search_code.return_value
+    paginated.totalCount = 5000
+    paginated.get_page.return_value = []
+    mock_gh.rate_limiting = (30, 30)
+
+    with pytest.raises(ValueError):
+        get_repos(None, "path:.github")
+    assert paginated.get_page.call_count == 10
+
+
+@mock.patch('patchstorm.github_utils._GH')
+def test_get_repos_reuses_cached_search(mock_gh, search_cache):
+    """Test that a search is served from memory, then from disk until it expires."""
+    paginated = mock_gh.search_code.return_value
+    paginated.totalCount = 1
+    paginated.get_page.return_value = [mock.Mock(**{"repository.full_name": "org/repo"})]
+    mock_gh.rate_limiting = (30, 30)
+
+    assert get_repos(None, "path:.github") == {"org/repo"}
+    assert get_repos(None, "path:.github") == {"org/repo"}
+    assert mock_gh.search_code.call_count == 1
+
+    # A new process only has the disk cache
+    github_utils._search_repos.cache_clear()
+    assert get_repos(None, "path:.github") == {"org/repo"}
+    assert mock_gh.search_code.call_count == 1
+
+    github_utils._search_repos.cache_clear()
+    with mock.patch.object(github_utils, 'SEARCH_CACHE_TTL', 0):
+        assert get_repos(None, "path:.github") == {"org/repo"}
+    assert mock_gh.search_code.call_count == 2
+
+
+@mock.patch('patchstorm.github_utils._GH')
+def test_get_repos_cache_is_per_organization(mock_gh, monkeypatch):
+    """Test that a cached search for one organization is not reused for another."""
+    paginated = mock_gh.search_code.return_value
+    paginated.totalCount = 1
+    paginated.get_page.return_value = [mock.Mock(**{"repository.full_name": "org/repo"})]
+    mock_gh.rate_limiting = (30, 30)
+
+    monkeypatch.setattr(github_utils, 'GITHUB_ORGANIZATION', 'org')
+    get_repos(None, "path:.github")
+    github_utils._search_repos.cache_clear()
+    monkeypatch.setattr(github_utils, 'GITHUB_ORGANIZATION', 'other-org')
+    get_repos(None, "path:.github")
+
+    assert [c[0][0] for c in mock_gh.search_code.call_args_list] == [
+        'org:org path:.github NOT is:archived',
+        'org:other-org path:.github NOT is:archived',
+    ]
+
+
+@mock.patch('patchstorm.github_utils._GH')
+def test_get_repos_unwritable_search_cache(mock_gh, monkeypatch, search_cache):
+    """Test that search results are still returned when the disk cache cannot be written."""
+    paginated = mock_gh.search_code.return_value
+    paginated.totalCount = 1
+    paginated.get_page.return_value = [mock.Mock(**{"repository.full_name": "org/repo"})]
+    mock_gh.rate_limiting = (30, 30)
+    not_a_dir = search_cache / "not_a_dir"
+    not_a_dir.write_text("")
+    monkeypatch.setattr(github_utils, 'SEARCH_CACHE_DIR', str(not_a_dir))
+
+    assert get_repos(None, "path:.github") == {"org/repo"}
@@ -1,5 +1,7 @@
 import json
 import unittest
+from dataclasses import fields
+
 from patchstorm.run_agent_config import RunAgentConfig
 
 
@@ -73,3 +75,17 @@ class TestRunAgentConfig(unittest.TestCase):
         
         self.assertIn("reviewers", config_dict)
         self.assertIsInstance(config_dict["reviewers"], list)
+
+    def test_to_dict_covers_all_fields(self):
+        config = RunAgentConfig(
+            commit_msg="Test message",
+            prompts=["Test prompt"],
+            agent_provider="codex",
+            repos={"test_repo"}
+        )
+
+        config_dict = config.to_dict()
+
+        # Every field must be serialized, including unset optional ones
+        self.assertEqual(set(config_dict), {f.name for f in fields(RunAgentConfig)})
+        self.assertIsNone(config_dict["reviewers"])
@@ -1,43 +1,31 @@
+import textwrap
+
 import pytest
 import unittest.mock as mock
-import warnings
-from patchstorm.task_definition import validate_task_definition_yaml
-import sys
-import os
-
-sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
-from run_agent import create_config_from_task_definition, get_repos
-from patchstorm.run_agent_config import RunAgentConfig
+from patchstorm.task_definition import validate_task_definition, validate_task_definition_yaml
 
 
-def test_valid_task_definition():
-    assert True == validate_task_definition_yaml("""
-    agent: 
+_YAML_BASE = textwrap.dedent("""
+    agent:
         provider: codex
     commit:
         message: "Test commit message"
     prompts:
         - prompt: "Test prompt"
-    """)
+""").strip()
 
-
-def test_valid_task_definition_with_search_query():
-    """Test that a task definition with search_query is validated correctly."""
-    assert True == validate_task_definition_yaml("""
-    agent: 
+_YAML_WITH_SEARCH_QUERY = textwrap.dedent("""
+    agent:
         provider: codex
     commit:
         message: "Test commit message"
     prompts:
         - prompt: "Test prompt"
     search_query: "path:.github language:YAML"
-    """)
-
+""").strip()
 
-def test_valid_task_definition_with_repos_new_format():
-    """Test that a task definition with repos in new format is validated correctly."""
-    assert True == validate_task_definition_yaml("""
-    agent: 
+_YAML_WITH_REPOS = textwrap.dedent("""
+    agent:
         provider: codex
     commit:
         message: "Test commit message"
@@ -48,13 +36,10 @@ def test_valid_task_definition_with_repos_new_format():
             - chanzuckerberg/patchstorm
             - chanzuckerberg/fogg
         search_query: '"set up working directory by installing dependencies" 0.92.2'
-    """)
+""").strip()
 
-
-def test_valid_task_definition_with_repos_exclude():
-    """Test that a task definition with repos exclude is validated correctly."""
-    assert True == validate_task_definition_yaml("""
-    agent: 
+_YAML_WITH_REPOS_EXCLUDE = textwrap.dedent("""
+    agent:
         provider: codex
     commit:
         message: "Test commit message"
@@ -67,67 +52,111 @@ def test_valid_task_definition_with_repos_exclude():
         exclude:
             - chanzuckerberg/some-other-repo
         search_query: '"set up working directory by installing dependencies" 0.92.2'
-    """)
-
+""").strip()
 
-def test_valid_task_definition_with_draft():
-    """Test that a task definition with draft is validated correctly."""
-    assert True == validate_task_definition_yaml("""
-    agent: 
+_YAML_WITH_DRAFT = textwrap.dedent("""
+    agent:
         provider: codex
     commit:
         message: "Test commit message"
     prompts:
         - prompt: "Test prompt"
     draft: true
-    """)
+""").strip()
 
+_YAML_INVALID_PROVIDER = textwrap.dedent("""
+    agent:
+        provider: invalid_provider
+    commit:
+        message: "Test commit message"
+    prompts:
+        - prompt: "Test prompt"
+""").strip()
 
-def test_invalid_agent_provider():
-    """Test that an invalid agent provider is rejected."""
-    with pytest.raises(ValueError) as excinfo:
-        validate_task_definition_yaml("""
-        agent: 
-            provider: invalid_provider
-        commit:
-            message: "Test commit message"
-        prompts:
-            - prompt: "Test prompt"
-        """)
-    assert "YAML validation error" in str(excinfo.value)
-
-
-def test_missing_prompt():
-    """Test that a missing prompt is rejected."""
+_YAML_MISSING_PROMPT = textwrap.dedent("""
+    agent:
+        provider: codex
+    commit:
+        message: "Test commit message"
+    prompts:
+        - not_prompt: "Test prompt"
+""").strip()
+
+_YAML_MISSING_COMMIT_MSG = textwrap.dedent("""
+    agent:
+        provider: codex
+    commit:
+        not_message: "Test commit message"
+    prompts:
+        - prompt: "Test prompt"
+""").strip()
+
+
+@pytest.mark.parametrize("yaml_text", [
+    _YAML_BASE,
+    _YAML_WITH_SEARCH_QUERY,
+    _YAML_WITH_REPOS,
+    _YAML_WITH_REPOS_EXCLUDE,
+    _YAML_WITH_DRAFT,
+], ids=["base", "search_query", "repos", "repos_exclude", "draft"])
+def test_valid_task_definition(yaml_text):
+    """Test that valid task definitions are accepted without raising."""
+    validate_task_definition_yaml(yaml_text)
+
+
+def test_validate_task_definition_yaml_returns_parsed_copy():
+    """Test that the parsed task definition is returned, and that changing it does not affect the next call."""
+    task_def = validate_task_definition_yaml(_YAML_WITH_DRAFT)
+    assert task_def["draft"] is True
+    assert task_def["prompts"] == [{"prompt": "Test prompt"}]
+
+    task_def["prompts"].append({"prompt": "Another prompt"})
+    assert validate_task_definition_yaml(_YAML_WITH_DRAFT)["prompts"] == [{"prompt": "Test prompt"}]
+
+
+@pytest.mark.parametrize("yaml_text, expected_substring", [
+    (_YAML_INVALID_PROVIDER, "YAML validation error"),
+    (_YAML_MISSING_PROMPT, "YAML validation error"),
+    (_YAML_MISSING_COMMIT_MSG, "YAML validation error"),
+], ids=["invalid_agent_provider", "missing_prompt", "missing_commit_message"])
+def test_invalid_task_definition(yaml_text, expected_substring):
+    """Test that invalid task definitions are rejected."""
     with pytest.raises(ValueError) as excinfo:
-        validate_task_definition_yaml("""
-        agent: 
-            provider: codex
-        commit:
-            message: "Test commit message"
-        prompts:
-            - not_prompt: "Test prompt"
-        """)
-    assert "YAML validation error" in str(excinfo.value)
-
-
-def test_missing_commit_message():
-    """Test that a missing commit message is rejected."""
+        validate_task_definition_yaml(yaml_text)
+    assert expected_substring in excinfo.value.args[0]
+
+
+@pytest.fixture
+def mock_get_repos():
+    """Replace run_agent.get_repos with an autospecced mock for the duration of a test."""
+    import run_agent
+
+    with mock.patch.object(run_agent, 'get_repos', autospec=True) as m:
+        yield m
+
+
+# Shared by every task definition built below; create_config_from_task_definition only reads it
+_BASE_TASK_DEF = {"agent": {"provider": "codex"}, "commit": {"message": "Test commit message"}, "prompts": [{"prompt": "Test prompt"}]}
+
+
+def _make_task_def(**kw):
+    """Build a minimal valid task definition, with top-level keys overridden by kw."""
+    return {**_BASE_TASK_DEF, **kw}
+
+
+def test_validate_parsed_task_definition():
+    """Test that an already parsed task definition is validated without reparsing."""
+    validate_task_definition(_make_task_def())
     with pytest.raises(ValueError) as excinfo:
-        validate_task_definition_yaml("""
-        agent: 
-            provider: codex
-        commit:
-            not_message: "Test commit message"
-        prompts:
-            - prompt: "Test prompt"
-        """)
-    assert "YAML validation error" in str(excinfo.value)
-
-
-@mock.patch('run_agent.get_repos')
+        validate_task_definition(_make_task_def(agent={"provider": "invalid_provider"}))
+    assert "YAML validation error" in excinfo.value.args[0]
+
+
 def test_convert_task_def_to_config(mock_get_repos):
     """Test converting a task definition to RunAgentConfig and test include/search_query union."""
+    from run_agent import create_config_from_task_definition
+    from patchstorm.run_agent_config import RunAgentConfig
+
     # Setup mock with different results for different search queries
     def mock_get_repos_side_effect(repos, search_query):
         if repos == "test/repo,another/repo":
@@ -139,23 +168,10 @@ def test_convert_task_def_to_config(mock_get_repos):
     mock_get_repos.side_effect = mock_get_repos_side_effect
     
     # First test with command line override
-    task_def = {
-        "agent": {
-            "provider": "codex"
-        },
-        "commit": {
-            "message": "Test commit message"
-        },
-        "prompts": [
-            {
-                "prompt": "Test prompt"
-            }
-        ],
-        "repos": {
-            "include": ["include/repo1", "include/repo2"],
-            "search_query": "path:.github language:YAML"
-        }
-    }
+    task_def = _make_task_def(repos={
+        "include": ["include/repo1", "include/repo2"],
+        "search_query": "path:.github language:YAML"
+    })
     
     config = create_config_from_task_definition(task_def, repos="test/repo,another/repo")
     
@@ -180,26 +196,15 @@ def test_convert_task_def_to_config(mock_get_repos):
     mock_get_repos.assert_called_with(None, "path:.github language:YAML")
 
 
-@mock.patch('run_agent.get_repos')
 def test_convert_task_def_with_search_query_to_config(mock_get_repos):
     """Test that search_query defined in task definition is used in RunAgentConfig."""
+    from run_agent import create_config_from_task_definition
+    from patchstorm.run_agent_config import RunAgentConfig
+
     # Setup mock to return a set of repos
     mock_get_repos.return_value = {"found/repo1", "found/repo2"}
     
-    task_def = {
-        "agent": {
-            "provider": "codex"
-        },
-        "commit": {
-            "message": "Test commit message"
-        },
-        "prompts": [
-            {
-                "prompt": "Test prompt"
-            }
-        ],
-        "search_query": "path:.github language:YAML"
-    }
+    task_def = _make_task_def(search_query="path:.github language:YAML")
     
     # Test with task definition search_query
     config = create_config_from_task_definition(task_def)
@@ -212,9 +217,11 @@ def test_convert_task_def_with_search_query_to_config(mock_get_repos):
     assert config.repos == {"found/repo1", "found/repo2"}
     mock_get_repos.assert_called_with(None, "override:query")
 
-@mock.patch('run_agent.get_repos')
 def test_convert_task_def_with_combined_repos_and_top_level_search_query(mock_get_repos):
     """Test that repositories from include are combined with those found by top-level search_query."""
+    from run_agent import create_config_from_task_definition
+    from patchstorm.run_agent_config import RunAgentConfig
+
     # Setup mock for different search query results
     def mock_get_repos_side_effect(repos, search_query):
         if search_query == "path:.github language:YAML":
@@ -223,26 +230,10 @@ def test_convert_task_def_with_combined_repos_and_top_level_search_query(mock_ge
     
     mock_get_repos.side_effect = mock_get_repos_side_effect
     
-    task_def = {
-        "agent": {
-            "provider": "codex"
-        },
-        "commit": {
-            "message": "Test commit message"
-        },
-        "prompts": [
-            {
-                "prompt": "Test prompt"
-            }
-        ],
-        "repos": {
-            "include": [
-                "chanzuckerberg/patchstorm",
-                "chanzuckerberg/fogg"
-            ]
-        },
-        "search_query": "path:.github language:YAML"
-    }
+    task_def = _make_task_def(
+        repos={"include": ["chanzuckerberg/patchstorm", "chanzuckerberg/fogg"]},
+        search_query="path:.github language:YAML",
+    )
     
     # Test combining repos from include and top-level search_query
     config = create_config_from_task_definition(task_def)
@@ -253,9 +244,11 @@ def test_convert_task_def_with_combined_repos_and_top_level_search_query(mock_ge
     mock_get_repos.assert_called_with(None, "path:.github language:YAML")
 
 
-@mock.patch('run_agent.get_repos')
 def test_convert_task_def_with_repos_exclude_to_config(mock_get_repos):
     """Test that repos exclude functionality works correctly."""
+    from run_agent import create_config_from_task_definition
+    from patchstorm.run_agent_config import RunAgentConfig
+
     # Setup mock to return test repos including some that should be excluded
     mock_repos_from_query = {"found/repo1", "found/repo2", "exclude/this", "exclude/this-one-too"}
     
@@ -267,31 +260,18 @@ def test_convert_task_def_with_repos_exclude_to_config(mock_get_repos):
     mock_get_repos.side_effect = mock_get_repos_side_effect
     
     # Test with include, exclude, and search_query
-    task_def = {
-        "agent": {
-            "provider": "codex"
-        },
-        "commit": {
-            "message": "Test commit message"
-        },
-        "prompts": [
-            {
-                "prompt": "Test prompt"
-            }
+    task_def = _make_task_def(repos={
+        "include": [
+            "include/repo1",
+            "include/repo2",
+            "exclude/this"  # This one should be excluded
+        ],
+        "exclude": [
+            "exclude/this",
+            "exclude/this-one-too"  # This should be excluded from search_query results
         ],
-        "repos": {
-            "include": [
-                "include/repo1",
-                "include/repo2",
-                "exclude/this"  # This one should be excluded
-            ],
-            "exclude": [
-                "exclude/this",
-                "exclude/this-one-too"  # This should be excluded from search_query results
-            ],
-            "search_query": "test search query"
-        }
-    }
+        "search_query": "test search query"
+    })
     
     config = create_config_from_task_definition(task_def)
     assert isinstance(config, RunAgentConfig)
@@ -303,38 +283,21 @@ def test_convert_task_def_with_repos_exclude_to_config(mock_get_repos):
     assert config.repos == expected_repos
     
     # Test with only exclude (no search_query)
-    task_def = {
-        "agent": {
-            "provider": "codex"
-        },
-        "commit": {
-            "message": "Test commit message"
-        },
-        "prompts": [
-            {
-                "prompt": "Test prompt"
-            }
-        ],
-        "repos": {
-            "include": [
-                "include/repo1",
-                "include/repo2",
-                "exclude/this"
-            ],
-            "exclude": [
-                "exclude/this"
-            ]
-        }
-    }
+    task_def = _make_task_def(repos={
+        "include": ["include/repo1", "include/repo2", "exclude/this"],
+        "exclude": ["exclude/this"]
+    })
     
     config = create_config_from_task_definition(task_def)
     assert isinstance(config, RunAgentConfig)
     assert config.repos == {"include/repo1", "include/repo2"}
 
 
-@mock.patch('run_agent.get_repos')
 def test_convert_task_def_with_repos_new_format_to_config(mock_get_repos):
     """Test that repos defined in new format are used in RunAgentConfig."""
+    from run_agent import create_config_from_task_definition
+    from patchstorm.run_agent_config import RunAgentConfig
+
     # Setup mock to return test repos for include list and search query results
     mock_repos_from_query = {"found/repo1", "found/repo2"}
     
@@ -348,47 +311,16 @@ def test_convert_task_def_with_repos_new_format_to_config(mock_get_repos):
     mock_get_repos.side_effect = mock_get_repos_side_effect
     
     # Test with include list only
-    task_def = {
-        "agent": {
-            "provider": "codex"
-        },
-        "commit": {
-            "message": "Test commit message"
-        },
-        "prompts": [
-            {
-                "prompt": "Test prompt"
-            }
-        ],
-        "repos": {
-            "include": [
-                "chanzuckerberg/patchstorm",
-                "chanzuckerberg/fogg"
-            ]
-        }
-    }
+    task_def = _make_task_def(repos={"include": ["chanzuckerberg/patchstorm", "chanzuckerberg/fogg"]})
     
     config = create_config_from_task_definition(task_def)
     assert isinstance(config, RunAgentConfig)
     assert config.repos == {"chanzuckerberg/patchstorm", "chanzuckerberg/fogg"}
     
     # Test with search_query only
-    task_def = {
-        "agent": {
-            "provider": "codex"
-        },
-        "commit": {
-            "message": "Test commit message"
-        },
-        "prompts": [
-            {
-                "prompt": "Test prompt"
-            }
-        ],
-        "repos": {
-            "search_query": '"set up working directory by installing dependencies" 0.92.2'
-        }
-    }
+    task_def = _make_task_def(repos={
+        "search_query": '"set up working directory by installing dependencies" 0.92.2'
+    })
     
     config = create_config_from_task_definition(task_def)
     assert isinstance(config, RunAgentConfig)
@@ -396,26 +328,10 @@ def test_convert_task_def_with_repos_new_format_to_config(mock_get_repos):
     mock_get_repos.assert_called_with(None, '"set up working directory by installing dependencies" 0.92.2')
     
     # Test with both include and search_query - SHOULD COMBINE RESULTS
-    task_def = {
-        "agent": {
-            "provider": "codex"
-        },
-        "commit": {
-            "message": "Test commit message"
-        },
-        "prompts": [
-            {
-                "prompt": "Test prompt"
-            }
-        ],
-        "repos": {
-            "include": [
-                "chanzuckerberg/patchstorm",
-                "chanzuckerberg/fogg"
-            ],
-            "search_query": '"set up working directory by installing dependencies" 0.92.2'
-        }
-    }
+    task_def = _make_task_def(repos={
+        "include": ["chanzuckerberg/patchstorm", "chanzuckerberg/fogg"],
+        "search_query": '"set up working directory by installing dependencies" 0.92.2'
+    })
     
     config = create_config_from_task_definition(task_def)
     assert isinstance(config, RunAgentConfig)
@@ -430,53 +346,23 @@ def test_convert_task_def_with_repos_new_format_to_config(mock_get_repos):
     mock_get_repos.assert_called_with("override/repo", None)
 
 
-@mock.patch('run_agent.get_repos')
 def test_convert_task_def_with_draft_to_config(mock_get_repos):
     """Test that draft defined in task definition is used in RunAgentConfig."""
+    from run_agent import create_config_from_task_definition
+    from patchstorm.run_agent_config import RunAgentConfig
+
     # Setup mock to return a set of repos
     mock_get_repos.return_value = {"test/repo"}
     
     # Test with draft=true in task definition - using new object format
-    task_def_with_draft = {
-        "agent": {
-            "provider": "codex"
-        },
-        "commit": {
-            "message": "Test commit message"
-        },
-        "prompts": [
-            {
-                "prompt": "Test prompt"
-            }
-        ],
-        "repos": {
-            "include": ["test/repo"]
-        },
-        "draft": True
-    }
+    task_def_with_draft = _make_task_def(repos={"include": ["test/repo"]}, draft=True)
     
     config = create_config_from_task_definition(task_def_with_draft)
     assert isinstance(config, RunAgentConfig)
     assert config.draft is True
     
     # Test with draft=false in task definition - using new object format
-    task_def_without_draft = {
-        "agent": {
-            "provider": "codex"
-        },
-        "commit": {
-            "message": "Test commit message"
-        },
-        "prompts": [
-            {
-                "prompt": "Test prompt"
-            }
-        ],
-        "repos": {
-            "include": ["test/repo"]
-        },
-        "draft": False
-    }
+    task_def_without_draft = _make_task_def(repos={"include": ["test/repo"]}, draft=False)
     
     config = create_config_from_task_definition(task_def_without_draft)
     assert isinstance(config, RunAgentConfig)
@@ -490,103 +376,59 @@ def test_convert_task_def_with_draft_to_config(mock_get_repos):
     assert config.draft is False
 
 
-@mock.patch('run_agent.get_repos')
 def test_task_def_with_both_legacy_repos_and_search_query(mock_get_repos):
     """Test that legacy repos format with search_query now fails with a ValueError."""
+    from run_agent import create_config_from_task_definition
+
     mock_get_repos.return_value = {"found/repo1", "found/repo2"}
     
-    task_def = {
-        "agent": {
-            "provider": "codex"
-        },
-        "commit": {
-            "message": "Test commit message"
-        },
-        "prompts": [
-            {
-                "prompt": "Test prompt"
-            }
-        ],
+    task_def = _make_task_def(
         # Legacy format is no longer supported
-        "repos": ["mygithuborg/repo1", "mygithuborg/repo2"],
-        "search_query": "path:.github language:YAML"
-    }
+        repos=["mygithuborg/repo1", "mygithuborg/repo2"],
+        search_query="path:.github language:YAML",
+    )
     
     # Test should raise ValueError because legacy format is no longer supported
     with pytest.raises(ValueError) as excinfo:
         create_config_from_task_definition(task_def)
     
-    assert "'repos' must be an object" in str(excinfo.value)
+    assert "'repos' must be an object" in excinfo.value.args[0]
     
     
 def test_task_def_with_conflicting_search_queries():
     """Test that specifying both repos.search_query and top-level search_query raises NotImplementedError."""
-    task_def = {
-        "agent": {
-            "provider": "codex"
-        },
-        "commit": {
-            "message": "Test commit message"
-        },
-        "prompts": [
-            {
-                "prompt": "Test prompt"
-            }
-        ],
-        "repos": {
-            "search_query": "query1"
-        },
-        "search_query": "query2"
-    }
+    from run_agent import create_config_from_task_definition
+
+    task_def = _make_task_def(repos={"search_query": "query1"}, search_query="query2")
     
     with pytest.raises(NotImplementedError) as excinfo:
         create_config_from_task_definition(task_def)
-    assert "Cannot specify both 'repos.search_query' and top-level 'search_query'" in str(excinfo.value)
+    assert "Cannot specify both 'repos.search_query' and top-level 'search_query'" in excinfo.value.args[0]
 
 
 def test_task_def_missing_required_fields():
+    from run_agent import create_config_from_task_definition
+
     # Missing agent provider
-    task_def1 = {
-        "commit": {
-            "message": "Test commit message"
-        },
-        "prompts": [
-            {
-                "prompt": "Test prompt"
-            }
-        ]
-    }
+    task_def1 = _make_task_def()
+    del task_def1["agent"]
     
     with pytest.raises(ValueError) as excinfo:
         create_config_from_task_definition(task_def1, repos="test/repo")
-    assert "agent.provider" in str(excinfo.value)
+    assert "agent.provider" in excinfo.value.args[0]
     
     # Missing commit message
-    task_def2 = {
-        "agent": {
-            "provider": "codex"
-        },
-        "prompts": [
-            {
-                "prompt": "Test prompt"
-            }
-        ]
-    }
+    task_def2 = _make_task_def()
+    del task_def2["commit"]
     
     with pytest.raises(ValueError) as excinfo:
         create_config_from_task_definition(task_def2, repos="test/repo")
-    assert "commit.message" in str(excinfo.value)
+    assert "commit.message" in excinfo.value.args[0]
     
     # Missing prompt
-    task_def3 = {
-        "agent": {
-            "provider": "codex"
-        },
-        "commit": {
-            "message": "Test commit message"
-        }
-    }
+    task_def3 = _make_task_def()
+    del task_def3["prompts"]
     
     with pytest.raises(ValueError) as excinfo:
         create_config_from_task_definition(task_def3, repos="test/repo")
-    assert "prompt" in str(excinfo.value)
\ No newline at end of file
+    assert "prompt" in excinfo.value.args[0]
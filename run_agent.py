@@ -1,5 +1,6 @@
 import argparse
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 from tasks.celery import app
@@ -10,7 +11,9 @@ from patchstorm.run_agent_config import RunAgentConfig
 from patchstorm.task_definition import validate_task_definition_yaml, SCHEMA
 from patchstorm.github_utils import get_repos, get_repo_prs
 from patchstorm.exceptions import PatchStormParserError
-import yaml
+
+# Number of repositories checked for an existing PR at the same time
+PR_CHECK_WORKERS = 8
 
 
 def load_task_definition(file_path):
@@ -36,8 +39,7 @@ def _load_task_definition_from_str(yaml_content):
         return None
         
     try:
-        if validate_task_definition_yaml(yaml_content):
-            return yaml.safe_load(yaml_content)
+        return validate_task_definition_yaml(yaml_content)
     except FileNotFoundError:
         raise ValueError(f"Task definition file not found: {file_path}")
     except Exception as e:
@@ -262,6 +264,20 @@ def create_config_from_args(args):
     )
 
 
+def _has_existing_pr(repo, commit_msg):
+    """
+    Check whether a repository already has an open PR titled with the commit message.
+
+    Args:
+        repo (str): The full repository name.
+        commit_msg (str): The commit message used as the PR title.
+
+    Returns:
+        bool: True if a matching open PR exists.
+    """
+    return any(pr.title == commit_msg for pr in get_repo_prs(repo))
+
+
 def main(args):
     try:
         if args.task_definition:
@@ -305,9 +321,13 @@ def main(args):
         print(f"agent provider: {config.agent_provider}")
         print(f"skip PR: {config.skip_pr}")
 
+    repos = list(config.repos)
+    with ThreadPoolExecutor(max_workers=PR_CHECK_WORKERS) as pool:
+        has_pr = pool.map(_has_existing_pr, repos, [config.commit_msg] * len(repos))
+
     filtered_repos = set()
-    for repo in config.repos:
-        if config.commit_msg in {pr.title for pr in get_repo_prs(repo)}:
+    for repo, exists in zip(repos, has_pr):
+        if exists:
             if config.dry:
                 print(f"Skipping {repo} because a PR already exists.")
             continue
@@ -317,11 +337,12 @@ def main(args):
     for repo in filtered_repos:
         print(f"  {repo}")
 
+    config_json = config.to_json()
     for repo in filtered_repos:
         if config.dry:
             print(f"Would run on {repo}")
             continue
-        clone_and_run_prompt.delay(repo, config.to_json())
+        clone_and_run_prompt.delay(repo, config_json)
 
     print("Tasks submitted. Run make logs-worker to check agent logs")
 
@@ -14,3 +14,26 @@ def run_bash_cmd(cmd, raise_on_error=True, log_cmd=False):
         raise Exception(f"Command failed with return code {result.returncode}: {result.stdout.strip()}")
 
     return result.stdout.strip(), result.returncode
+
+
+def run_bash_cmd_to_file(cmd, output_path, raise_on_error=True, log_cmd=False):
+    """Run a command in the terminal, streaming its output to a file and stdout.
+
+    Only the last non-empty line of output is kept in memory and returned, for commands
+    whose full output is too large to hold on to.
+    """
+    if log_cmd:
+        print(cmd)
+    last_line = ''
+    with open(output_path, 'w') as f, subprocess.Popen(
+        cmd, shell=True, text=True, stderr=subprocess.STDOUT, stdout=subprocess.PIPE
+    ) as proc:
+        for line in proc.stdout:
+            f.write(line)
+            print(line, end='')
+            if line.strip():
+                last_line = line
+    if raise_on_error and proc.returncode != 0:
+        raise Exception(f"Command failed with return code {proc.returncode}: {last_line.strip()}")
+
+    return last_line.strip(), proc.returncode
@@ -0,0 +1,41 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from tasks.cmdline_utils import run_bash_cmd_to_file
+
+
+class TestRunBashCmdToFile(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.output_path = os.path.join(self.test_dir, "output.log")
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_writes_full_output_and_returns_last_line(self):
+        """Test that all output is written to the file and the last non-empty line is returned."""
+        result = run_bash_cmd_to_file("printf 'a\\n{\"x\":1}\\n\\n'", self.output_path)
+
+        with open(self.output_path) as f:
+            self.assertEqual(f.read(), 'a\n{"x":1}\n\n')
+        self.assertEqual(result, ('{"x":1}', 0))
+
+    def test_raises_on_failure(self):
+        """Test that a non-zero exit code raises, with the output still written to the file."""
+        with self.assertRaises(Exception) as context:
+            run_bash_cmd_to_file("echo boom; exit 3", self.output_path)
+
+        self.assertIn("return code 3: boom", str(context.exception))
+        with open(self.output_path) as f:
+            self.assertEqual(f.read(), "boom\n")
+
+    def test_returns_failure_when_not_raising(self):
+        """Test that the exit code is returned when raise_on_error is False."""
+        result = run_bash_cmd_to_file("echo boom; exit 3", self.output_path, raise_on_error=False)
+
+        self.assertEqual(result, ("boom", 3))
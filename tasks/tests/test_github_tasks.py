@@ -57,8 +57,8 @@ class TestCloneAndRunPrompt(unittest.TestCase):
             with open(os.path.join(repo_dir, "README.md"), "a") as f:
                 f.write("\n\nThis line was added by the AI agent.")
             
-            # Return mock output including JSON stats
-            return "Mock agent output\n{\"cost_usd\": 0.01, \"duration_ms\": 1000, \"duration_api_ms\": 500, \"role\": \"test\"}"
+            # Return the last line of agent output, which holds the JSON stats
+            return "{\"cost_usd\": 0.01, \"duration_ms\": 1000, \"duration_api_ms\": 500, \"role\": \"test\"}"
         
         mock_run_agent.side_effect = mock_run_agent_implementation
 
@@ -98,7 +98,7 @@ class TestCloneAndRunPrompt(unittest.TestCase):
         def mock_run_agent_implementation(config, repo_dir, run_id):
             with open(os.path.join(repo_dir, "README.md"), "a") as f:
                 f.write("\nModified by test.")
-            return "Mock agent output\n{\"cost_usd\": 0.01, \"duration_ms\": 1000, \"duration_api_ms\": 500, \"role\": \"test\"}"
+            return "{\"cost_usd\": 0.01, \"duration_ms\": 1000, \"duration_api_ms\": 500, \"role\": \"test\"}"
         
         mock_run_agent.side_effect = mock_run_agent_implementation
         
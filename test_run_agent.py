@@ -1,9 +1,10 @@
 import os
 import sys
-import unittest
+import textwrap
 import unittest.mock as mock
 from argparse import Namespace
-import io
+from collections import namedtuple
+from types import MappingProxyType, SimpleNamespace
 import pytest
 from typing import Set
 
@@ -13,412 +14,298 @@ from patchstorm.run_agent_config import RunAgentConfig
 from patchstorm.exceptions import PatchStormParserError
 
 
-class TestRunAgent(unittest.TestCase):
-    """Test the run_agent.py main function with various inputs."""
-
-    def setUp(self):
-        # Create a patch for the get_repos function that returns a controlled set of repos
-        self.get_repos_patcher = mock.patch('run_agent.get_repos')
-        self.mock_get_repos = self.get_repos_patcher.start()
-        
-        # Create a patch for the get_repo_prs function
-        self.get_repo_prs_patcher = mock.patch('run_agent.get_repo_prs')
-        self.mock_get_repo_prs = self.get_repo_prs_patcher.start()
-        self.mock_get_repo_prs.return_value = []
-        
-        # Create a patch for clone_and_run_prompt.delay
-        self.clone_patcher = mock.patch('run_agent.clone_and_run_prompt.delay')
-        self.mock_clone_delay = self.clone_patcher.start()
-    
-    def tearDown(self):
-        self.get_repos_patcher.stop()
-        self.get_repo_prs_patcher.stop()
-        self.clone_patcher.stop()
-
-    def test_main_with_task_definition(self):
-        """Test main with a task definition file."""
-        # Setup mocks
-        self.mock_get_repos.return_value = {"test/repo1", "test/repo2"}
-        
-        # Create a mock args object
-        args = Namespace(
-            task_definition="test_task_definition.yaml",
-            prompt=None,
-            repos=None,
-            search_query=None,
-            dry=False,
-            skip_pr=False,
-            reviewers=None,
-            draft=None,
-            agent_provider=None,
-            commit_msg=None
+# Stand-in for patchstorm.github_utils.PullRequest; run_agent only reads the title
+_PR = namedtuple('_PR', 'title')
+
+# Task definition piped to run_agent on stdin
+_STDIN_TASK_YAML = textwrap.dedent("""
+    agent:
+      provider: claude_code
+    commit:
+      message: Test stdin commit message
+    prompts:
+      - prompt: Test stdin prompt
+    repos:
+      include:
+        - test/repo1
+""").lstrip()
+
+# Baseline command line arguments for the tests, with every flag unset.
+# Unlike the argparse defaults, agent_provider and reviewers are None here.
+_DEFAULT_ARGS = MappingProxyType(dict(
+    task_definition=None,
+    prompt=None,
+    repos=None,
+    search_query=None,
+    dry=False,
+    skip_pr=False,
+    reviewers=None,
+    draft=None,
+    agent_provider=None,
+    commit_msg=None,
+))
+
+
+@pytest.fixture(autouse=True)
+def mocked_run_agent():
+    """Patch the GitHub and Celery entry points run_agent uses with a single patcher."""
+    with mock.patch.multiple(
+        run_agent,
+        get_repos=mock.DEFAULT,
+        get_repo_prs=mock.DEFAULT,
+        clone_and_run_prompt=mock.DEFAULT,
+    ) as mocks:
+        mocks['get_repo_prs'].return_value = []
+        yield SimpleNamespace(
+            get_repos=mocks['get_repos'],
+            get_repo_prs=mocks['get_repo_prs'],
+            clone_delay=mocks['clone_and_run_prompt'].delay,
         )
-        
-        # Mock the load_task_definition function
-        with mock.patch('run_agent.load_task_definition') as mock_load_task_def:
-            # Define a task definition similar to what would be loaded from YAML
-            mock_task_def = {
-                "agent": {
-                    "provider": "claude_code"
-                },
-                "commit": {
-                    "message": "Test commit message"
-                },
-                "prompts": [
-                    {
-                        "prompt": "Test prompt"
-                    }
-                ],
-                "repos": {
-                    "include": ["test/repo1", "test/repo2"]
-                }
+
+
+@pytest.fixture
+def mock_load_task_def():
+    """Patch run_agent.load_task_definition, so no task definition file needs to exist."""
+    with mock.patch.object(run_agent, 'load_task_definition') as m:
+        yield m
+
+
+@pytest.fixture
+def mock_stdin():
+    """Patch sys.stdin, so tests control whether a task definition is piped in."""
+    with mock.patch.object(sys, 'stdin') as m:
+        yield m
+
+
+def _make_args(**overrides):
+    """Build a Namespace of command line arguments from the tests' baseline, with the given overrides."""
+    return Namespace(**{**_DEFAULT_ARGS, **overrides})
+
+
+def _assert_config(mock_call, **expected):
+    """Assert that the config JSON a clone_and_run_prompt.delay call was made with has the expected fields."""
+    config = RunAgentConfig.from_json(mock_call.args[1])
+    for field, value in expected.items():
+        assert getattr(config, field) == value, field
+
+
+def test_main_with_task_definition(mocked_run_agent, mock_load_task_def):
+    """Test main with a task definition file."""
+    # Setup mocks
+    mocked_run_agent.get_repos.return_value = {"test/repo1", "test/repo2"}
+
+    # Create a mock args object
+    args = _make_args(task_definition="test_task_definition.yaml")
+
+    # Define a task definition similar to what would be loaded from YAML
+    mock_task_def = {
+        "agent": {
+            "provider": "claude_code"
+        },
+        "commit": {
+            "message": "Test commit message"
+        },
+        "prompts": [
+            {
+                "prompt": "Test prompt"
             }
-            mock_load_task_def.return_value = mock_task_def
-            
-            # Call the function under test
-            run_agent.main(args)
-            
-            # Assertions
-            mock_load_task_def.assert_called_with("test_task_definition.yaml")
-            self.mock_get_repo_prs.assert_any_call("test/repo1")
-            self.mock_get_repo_prs.assert_any_call("test/repo2")
-            
-            # Check that clone_and_run_prompt was called for both repos
-            self.assertEqual(self.mock_clone_delay.call_count, 2)
-            
-            # Check that the calls were with the right repos
-            repos_in_calls = {call[0][0] for call in self.mock_clone_delay.call_args_list}
-            self.assertEqual(repos_in_calls, {"test/repo1", "test/repo2"})
-
-    def test_main_with_prompt(self):
-        """Test main with a direct prompt."""
-        # Setup mocks
-        self.mock_get_repos.return_value = {"test/repo1"}
-        
-        # Create a mock args object with a prompt and commit message
-        args = Namespace(
-            task_definition=None,
-            prompt="Test prompt",
-            repos="test/repo1",
-            search_query=None,
-            dry=False,
-            skip_pr=False,
-            reviewers=None,
-            draft=False,
-            agent_provider="codex",
-            commit_msg="Test commit message"
-        )
-        
-        # Call the function under test
-        run_agent.main(args)
-        
-        # Assertions
-        self.mock_get_repos.assert_called_with("test/repo1", None)
-        self.mock_get_repo_prs.assert_called_with("test/repo1")
-        
-        # Check that clone_and_run_prompt was called once
-        self.mock_clone_delay.assert_called_once()
-        call_args = self.mock_clone_delay.call_args[0]
-        self.assertEqual(call_args[0], "test/repo1")
-        
-        # Check that the config JSON passed to clone_and_run_prompt is correct
-        config = RunAgentConfig.from_json(call_args[1])
-        self.assertEqual(config.prompts, ["Test prompt"])
-        self.assertEqual(config.commit_msg, "Test commit message")
-        self.assertEqual(config.agent_provider, "codex")
-        self.assertEqual(config.repos, {"test/repo1"})
-        self.assertFalse(config.skip_pr)
-        self.assertFalse(config.dry)
-        self.assertFalse(config.draft)
-
-    def test_main_with_search_query(self):
-        """Test main with a search query."""
-        # Setup mocks
-        self.mock_get_repos.return_value = {"found/repo1", "found/repo2"}
-        
-        # Create a mock args object with a search query
-        args = Namespace(
-            task_definition=None,
-            prompt="Test prompt",
-            repos=None,
-            search_query="language:python path:.github",
-            dry=False,
-            skip_pr=False,
-            reviewers="user1,user2",
-            draft=True,
-            agent_provider="codex",
-            commit_msg="Test commit message"
-        )
-        
-        # Call the function under test
-        run_agent.main(args)
-        
-        # Assertions
-        self.mock_get_repos.assert_called_with(None, "language:python path:.github")
-        
-        # Check that clone_and_run_prompt was called twice (once for each repo)
-        self.assertEqual(self.mock_clone_delay.call_count, 2)
-        
-        # Verify one of the calls
-        for call in self.mock_clone_delay.call_args_list:
-            repo = call[0][0]
-            self.assertIn(repo, {"found/repo1", "found/repo2"})
-            config = RunAgentConfig.from_json(call[0][1])
-            self.assertEqual(config.reviewers, {"user1", "user2"})
-            self.assertTrue(config.draft)
-
-    def test_main_with_stdin_task_definition(self):
-        """Test main with task definition from stdin."""
-        # Setup mocks
-        self.mock_get_repos.return_value = {"test/repo1"}
-        
-        # Mock stdin to return a task definition
-        with mock.patch('sys.stdin') as mock_stdin:
-            mock_stdin.isatty.return_value = False
-            mock_stdin.read.return_value = """
-            agent:
-              provider: claude_code
-            commit:
-              message: Test stdin commit message
-            prompts:
-              - prompt: Test stdin prompt
-            repos:
-              include:
-                - test/repo1
-            """
-            
-            # Create a mock args object without task_definition or prompt
-            args = Namespace(
-                task_definition=None,
-                prompt=None,
-                repos=None,
-                search_query=None,
-                dry=False,
-                skip_pr=False,
-                reviewers=None,
-                draft=None,
-                agent_provider=None,
-                commit_msg=None
-            )
-            
-            # Mock the validate_task_definition_yaml function
-            with mock.patch('run_agent.validate_task_definition_yaml') as mock_validate:
-                mock_validate.return_value = True
-                
-                # Call the function under test
-                run_agent.main(args)
-            
-            # Assertions
-            mock_stdin.read.assert_called_once()
-            self.mock_get_repo_prs.assert_called_with("test/repo1")
-            self.mock_clone_delay.assert_called_once()
-            
-            # Verify the config
-            call_args = self.mock_clone_delay.call_args[0]
-            self.assertEqual(call_args[0], "test/repo1")
-            config = RunAgentConfig.from_json(call_args[1])
-            self.assertEqual(config.commit_msg, "Test stdin commit message")
-            self.assertEqual(config.prompts, ["Test stdin prompt"])
-            self.assertEqual(config.agent_provider, "claude_code")
-
-    def test_main_dry_run(self):
-        """Test dry run mode."""
-        # Setup mocks
-        self.mock_get_repos.return_value = {"test/repo"}
-        
-        # Create a mock args object with dry=True
-        args = Namespace(
-            task_definition=None,
-            prompt="Test prompt",
-            repos="test/repo",
-            search_query=None,
-            dry=True,
-            skip_pr=False,
-            reviewers=None,
-            draft=None,
-            agent_provider="codex",
-            commit_msg="Test commit message"
-        )
-        
-        # Capture stdout to check dry run output
-        captured_output = io.StringIO()
-        sys.stdout = captured_output
-        
-        try:
-            # Call the function under test
-            run_agent.main(args)
-            
-            # Assertions
-            output = captured_output.getvalue()
-            self.assertIn("would run with prompts: ['Test prompt']", output)
-            self.assertIn("commit message: Test commit message", output)
-            self.assertIn("agent provider: codex", output)
-            self.assertIn("Would run on test/repo", output)
-            
-            # Make sure the task was not actually submitted
-            self.mock_clone_delay.assert_not_called()
-        finally:
-            sys.stdout = sys.__stdout__  # Reset stdout
-
-    def test_main_no_inputs(self):
-        """Test with no inputs provided."""
-        # Create a mock args object with no inputs
-        args = Namespace(
-            task_definition=None,
-            prompt=None,
-            repos=None,
-            search_query=None,
-            dry=False,
-            skip_pr=False,
-            reviewers=None,
-            draft=None,
-            agent_provider=None,
-            commit_msg=None
-        )
-        
-        # Mock stdin to simulate empty stdin
-        with mock.patch('sys.stdin') as mock_stdin:
-            mock_stdin.isatty.return_value = True
-            mock_stdin.read.return_value = None
-            
-            # We expect this to raise a PatchStormParserError due to no input
-            with self.assertRaises(PatchStormParserError) as context:
-                # Call the function under test
-                run_agent.main(args)
-            
-            # Verify the error message
-            self.assertEqual("You must provide a task definition file or a prompt.", context.exception.message)
-
-    def test_main_missing_commit_message(self):
-        """Test error when missing commit message."""
-        # Create a mock args object missing commit message
-        args = Namespace(
-            task_definition=None,
-            prompt="Test prompt",
-            repos="test/repo",
-            search_query=None,
-            dry=False,
-            skip_pr=False,  # Not skipping PR but missing commit message
-            reviewers=None,
-            draft=None,
-            agent_provider="codex",
-            commit_msg=None  # Missing commit message
-        )
-        
-        # Mock get_repos to avoid GitHub API calls
-        with mock.patch('run_agent.get_repos') as mock_get_repos:
-            mock_get_repos.return_value = {"test/repo"}
-            
-            # We expect this to raise a PatchStormParserError due to missing commit message
-            with self.assertRaises(PatchStormParserError) as context:
-                # Call the function under test
-                run_agent.main(args)
-            
-            # Verify the error message
-            self.assertEqual("You must provide a commit message with --commit-msg", context.exception.message)
-    
-    def test_create_config_from_args_missing_commit_message(self):
-        """Test that create_config_from_args raises an error when commit message is missing."""
-        # Create a mock args object missing commit message
-        args = Namespace(
-            task_definition=None,
-            prompt="Test prompt",
-            repos="test/repo",
-            search_query=None,
-            dry=False,
-            skip_pr=False,  # Not skipping PR but missing commit message
-            reviewers=None,
-            draft=None,
-            agent_provider="codex",
-            commit_msg=None  # Missing commit message
-        )
-        
-        # Mock get_repos to avoid GitHub API calls
-        with mock.patch('run_agent.get_repos') as mock_get_repos:
-            mock_get_repos.return_value = {"test/repo"}
-            
-            # We expect this to raise a PatchStormParserError due to missing commit message
-            with self.assertRaises(PatchStormParserError) as context:
-                # Call the function under test directly
-                run_agent.create_config_from_args(args)
-            
-            # Verify the error message
-            self.assertEqual("You must provide a commit message with --commit-msg", context.exception.message)
-
-    def test_skip_repos_with_existing_prs(self):
-        """Test that repos with existing PRs are skipped."""
-        # Setup mocks
-        self.mock_get_repos.return_value = {"repo/with_pr", "repo/without_pr"}
-        
-        # Mock to simulate one repo already has a PR with same title
-        def get_repo_prs_side_effect(repo):
-            if repo == "repo/with_pr":
-                # Create a mock PR object with a title matching the commit message
-                mock_pr = mock.MagicMock()
-                mock_pr.title = "Test commit message"
-                return [mock_pr]
-            else:
-                return []
-                
-        self.mock_get_repo_prs.side_effect = get_repo_prs_side_effect
-        
-        # Create a mock args object
-        args = Namespace(
-            task_definition=None,
-            prompt="Test prompt",
-            repos="repo/with_pr,repo/without_pr",
-            search_query=None,
-            dry=False,
-            skip_pr=False,
-            reviewers=None,
-            draft=None,
-            agent_provider="codex",
-            commit_msg="Test commit message"
-        )
-        
+        ],
+        "repos": {
+            "include": ["test/repo1", "test/repo2"]
+        }
+    }
+    mock_load_task_def.return_value = mock_task_def
+
+    # Call the function under test
+    run_agent.main(args)
+
+    # Assertions
+    mock_load_task_def.assert_called_with("test_task_definition.yaml")
+    mocked_run_agent.get_repo_prs.assert_any_call("test/repo1")
+    mocked_run_agent.get_repo_prs.assert_any_call("test/repo2")
+
+    # Check that clone_and_run_prompt was called once for each repo
+    calls = list(mocked_run_agent.clone_delay.call_args_list)
+    assert len(calls) == 2
+    assert {call.args[0] for call in calls} == {"test/repo1", "test/repo2"}
+
+
+@pytest.mark.parametrize("args_kwargs, found_repos, expected_get_repos_args, expected_config", [
+    pytest.param(
+        dict(prompt="Test prompt", repos="test/repo1", draft=False, agent_provider="codex", commit_msg="Test commit message"),
+        {"test/repo1"},
+        ("test/repo1", None),
+        dict(prompts=["Test prompt"], commit_msg="Test commit message", agent_provider="codex",
+             repos={"test/repo1"}, skip_pr=False, dry=False, draft=False),
+        id="prompt",
+    ),
+    pytest.param(
+        dict(prompt="Test prompt", search_query="language:python path:.github", reviewers="user1,user2", draft=True,
+             agent_provider="codex", commit_msg="Test commit message"),
+        {"found/repo1", "found/repo2"},
+        (None, "language:python path:.github"),
+        dict(reviewers={"user1", "user2"}, draft=True),
+        id="search_query",
+    ),
+    pytest.param(
+        dict(prompt="Test prompt", repos="test/repo", reviewers="user1,user2,user3", draft=False,
+             agent_provider="codex", commit_msg="Test commit message"),
+        {"test/repo"},
+        ("test/repo", None),
+        dict(reviewers={"user1", "user2", "user3"}),
+        id="reviewers",
+    ),
+])
+def test_main_with_prompt(mocked_run_agent, args_kwargs, found_repos, expected_get_repos_args, expected_config):
+    """Test main with a direct prompt submits one task per repo, with the config built from the arguments."""
+    mocked_run_agent.get_repos.return_value = found_repos
+
+    run_agent.main(_make_args(**args_kwargs))
+
+    mocked_run_agent.get_repos.assert_called_with(*expected_get_repos_args)
+    assert {call.args[0] for call in mocked_run_agent.get_repo_prs.call_args_list} == found_repos
+
+    # Check that clone_and_run_prompt was called once for each repo
+    calls = list(mocked_run_agent.clone_delay.call_args_list)
+    assert len(calls) == len(found_repos)
+    assert {call.args[0] for call in calls} == found_repos
+
+    # Check that the config JSON passed to clone_and_run_prompt is correct
+    for call in calls:
+        _assert_config(call, **expected_config)
+
+
+@pytest.mark.slow
+def test_main_with_stdin_task_definition(mocked_run_agent, mock_stdin):
+    """Test main with task definition from stdin."""
+    # Setup mocks
+    mocked_run_agent.get_repos.return_value = {"test/repo1"}
+
+    # Make stdin return a task definition
+    mock_stdin.isatty.return_value = False
+    mock_stdin.read.return_value = _STDIN_TASK_YAML
+
+    # Create a mock args object without task_definition or prompt
+    args = _make_args()
+
+    # Call the function under test
+    run_agent.main(args)
+
+    # Assertions
+    mock_stdin.read.assert_called_once()
+    mocked_run_agent.get_repo_prs.assert_called_with("test/repo1")
+    mocked_run_agent.clone_delay.assert_called_once()
+
+    # Verify the config
+    assert mocked_run_agent.clone_delay.call_args.args[0] == "test/repo1"
+    _assert_config(
+        mocked_run_agent.clone_delay.call_args,
+        commit_msg="Test stdin commit message",
+        prompts=["Test stdin prompt"],
+        agent_provider="claude_code",
+    )
+
+
+def test_main_dry_run(mocked_run_agent, capsys):
+    """Test dry run mode."""
+    # Setup mocks
+    mocked_run_agent.get_repos.return_value = {"test/repo"}
+
+    # Create a mock args object with dry=True
+    args = _make_args(prompt="Test prompt", repos="test/repo", dry=True, agent_provider="codex", commit_msg="Test commit message")
+
+    # Call the function under test
+    run_agent.main(args)
+
+    # Assertions
+    output = capsys.readouterr().out
+    assert "would run with prompts: ['Test prompt']" in output
+    assert "commit message: Test commit message" in output
+    assert "agent provider: codex" in output
+    assert "Would run on test/repo" in output
+
+    # Make sure the task was not actually submitted
+    mocked_run_agent.clone_delay.assert_not_called()
+
+
+def test_main_no_inputs(mock_stdin):
+    """Test with no inputs provided."""
+    # Create a mock args object with no inputs
+    args = _make_args()
+
+    # Simulate an interactive terminal, with nothing piped to stdin
+    mock_stdin.isatty.return_value = True
+    mock_stdin.read.return_value = None
+
+    # We expect this to raise a PatchStormParserError due to no input
+    with pytest.raises(PatchStormParserError) as excinfo:
         # Call the function under test
         run_agent.main(args)
-        
-        # Assertions
-        self.mock_get_repos.assert_called_with("repo/with_pr,repo/without_pr", None)
-        
-        # Check that clone_and_run_prompt was called only for repo/without_pr
-        self.mock_clone_delay.assert_called_once()
-        call_args = self.mock_clone_delay.call_args[0]
-        self.assertEqual(call_args[0], "repo/without_pr")
-
-    def test_main_with_reviewers(self):
-        """Test main with reviewers."""
-        # Setup mocks
-        self.mock_get_repos.return_value = {"test/repo"}
-        
-        # Create a mock args object with reviewers
-        args = Namespace(
-            task_definition=None,
-            prompt="Test prompt",
-            repos="test/repo",
-            search_query=None,
-            dry=False,
-            skip_pr=False,
-            reviewers="user1,user2,user3",
-            draft=False,
-            agent_provider="codex",
-            commit_msg="Test commit message"
-        )
-        
+
+    # Verify the error message
+    assert "You must provide a task definition file or a prompt." == excinfo.value.message
+
+
+def test_main_missing_commit_message(mocked_run_agent):
+    """Test error when missing commit message."""
+    # Create a mock args object missing commit message
+    args = _make_args(prompt="Test prompt", repos="test/repo", agent_provider="codex")
+
+    mocked_run_agent.get_repos.return_value = {"test/repo"}
+
+    # We expect this to raise a PatchStormParserError due to missing commit message
+    with pytest.raises(PatchStormParserError) as excinfo:
         # Call the function under test
         run_agent.main(args)
-        
-        # Assertions
-        self.mock_get_repos.assert_called_with("test/repo", None)
-        self.mock_get_repo_prs.assert_called_with("test/repo")
-        
-        # Check that the reviewers were set correctly
-        self.mock_clone_delay.assert_called_once()
-        call_args = self.mock_clone_delay.call_args[0]
-        config = RunAgentConfig.from_json(call_args[1])
-        self.assertEqual(config.reviewers, {"user1", "user2", "user3"})
+
+    # Verify the error message
+    assert "You must provide a commit message with --commit-msg" == excinfo.value.message
+
+
+def test_create_config_from_args_missing_commit_message(mocked_run_agent):
+    """Test that create_config_from_args raises an error when commit message is missing."""
+    # Create a mock args object missing commit message
+    args = _make_args(prompt="Test prompt", repos="test/repo", agent_provider="codex")
+
+    mocked_run_agent.get_repos.return_value = {"test/repo"}
+
+    # We expect this to raise a PatchStormParserError due to missing commit message
+    with pytest.raises(PatchStormParserError) as excinfo:
+        # Call the function under test directly
+        run_agent.create_config_from_args(args)
+
+    # Verify the error message
+    assert "You must provide a commit message with --commit-msg" == excinfo.value.message
+
+
+def test_skip_repos_with_existing_prs(mocked_run_agent):
+    """Test that repos with existing PRs are skipped."""
+    # Setup mocks
+    mocked_run_agent.get_repos.return_value = {"repo/with_pr", "repo/without_pr"}
+
+    # Mock to simulate one repo already has a PR with same title
+    def get_repo_prs_side_effect(repo):
+        if repo == "repo/with_pr":
+            # An open PR with a title matching the commit message
+            return [_PR(title="Test commit message")]
+        else:
+            return []
+
+    mocked_run_agent.get_repo_prs.side_effect = get_repo_prs_side_effect
+
+    # Create a mock args object
+    args = _make_args(prompt="Test prompt", repos="repo/with_pr,repo/without_pr", agent_provider="codex", commit_msg="Test commit message")
+
+    # Call the function under test
+    run_agent.main(args)
+
+    # Assertions
+    mocked_run_agent.get_repos.assert_called_with("repo/with_pr,repo/without_pr", None)
+
+    # Check that clone_and_run_prompt was called only for repo/without_pr
+    mocked_run_agent.clone_delay.assert_called_once()
+    assert mocked_run_agent.clone_delay.call_args.args[0] == "repo/without_pr"
 
 
 if __name__ == "__main__":
-    pytest.main()
\ No newline at end of file
+    pytest.main([__file__])
\ No newline at end of file